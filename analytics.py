@@ -0,0 +1,197 @@
+from __future__ import annotations
+import os
+import threading
+from typing import Iterable
+from urllib.parse import quote
+
+from db import DEFAULT_USER, fetch_changes_since, get_data_version, iter_shift_rows
+
+ANALYTICS_DIR = "analytics_cache"
+CATEGORY_CODES = {"work": 0, "proposal": 1}
+_COLUMNS = ("id", "day", "start_min", "minutes", "category", "wp")
+
+_snapshots: dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+# ---------- Snapshot ----------
+# 勤務・提案を列ごとの numpy 配列で持つ（アーカイブ済みの月も含む）。
+#   day: 1970-01-01 からの日数 / start_min, minutes: 分 / wp: workplaces の添字
+# 時給は表示の時に wp で引いて掛ける（時給を変えても作り直さない）。
+# ユーザーごとに .npz で保存し、変更フィードで変わった予定だけ入れ替える
+def _cache_path(user_id: str) -> str:
+    return os.path.join(ANALYTICS_DIR, f"{quote(user_id, safe='')}.npz")
+
+
+def _empty() -> dict:
+    import numpy as np
+
+    return {
+        "id": np.zeros(0, dtype=np.int64),
+        "day": np.zeros(0, dtype=np.int32),
+        "start_min": np.zeros(0, dtype=np.int16),
+        "minutes": np.zeros(0, dtype=np.int16),
+        "category": np.zeros(0, dtype=np.int8),
+        "wp": np.zeros(0, dtype=np.int16),
+        "workplaces": [],
+        "version": 0,
+    }
+
+
+def _append_rows(snap: dict, chunks: Iterable[list[tuple]]) -> dict:
+    # チャンクごとに配列にしてから最後に1回だけつなぐ（行のタプルは溜めない）
+    import numpy as np
+
+    workplaces = list(snap["workplaces"])
+    wp_index = {w: i for i, w in enumerate(workplaces)}
+    parts = {k: [snap[k]] for k in _COLUMNS}
+    for rows in chunks:
+        ids, days, starts, mins, cats, wps = [], [], [], [], [], []
+        for event_id, ev_date, start, end, category, wp in rows:
+            s = int(start[:2]) * 60 + int(start[3:5])
+            e = int(end[:2]) * 60 + int(end[3:5])
+            if wp not in wp_index:
+                wp_index[wp] = len(workplaces)
+                workplaces.append(wp)
+            ids.append(event_id)
+            days.append(ev_date)
+            starts.append(s)
+            mins.append(e - s)
+            cats.append(CATEGORY_CODES[category])
+            wps.append(wp_index[wp])
+        parts["id"].append(np.array(ids, dtype=np.int64))
+        parts["day"].append(np.array(days, dtype="datetime64[D]").astype(np.int32))
+        parts["start_min"].append(np.array(starts, dtype=np.int16))
+        parts["minutes"].append(np.array(mins, dtype=np.int16))
+        parts["category"].append(np.array(cats, dtype=np.int8))
+        parts["wp"].append(np.array(wps, dtype=np.int16))
+    out = {k: np.concatenate(v) for k, v in parts.items()}
+    out.update(workplaces=workplaces, version=snap["version"])
+    return out
+
+
+def _read(user_id: str) -> dict | None:
+    import numpy as np
+
+    path = _cache_path(user_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as z:
+            snap = {k: z[k] for k in _COLUMNS}
+            snap["workplaces"] = [str(w) for w in z["workplaces"]]
+            snap["version"] = int(z["version"])
+    except (OSError, KeyError, ValueError):
+        return None  # 壊れていたら作り直す
+    return snap
+
+
+def _write(user_id: str, snap: dict):
+    import numpy as np
+
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    path = _cache_path(user_id)
+    tmp = path + ".tmp.npz"
+    np.savez(
+        tmp, **{k: snap[k] for k in _COLUMNS},
+        workplaces=np.array(snap["workplaces"], dtype=str), version=np.int64(snap["version"]),
+    )
+    os.replace(tmp, path)
+
+
+def load_snapshot(user_id: str = DEFAULT_USER) -> dict:
+    # 最新の版に追いついたスナップショット。変わっていなければSQLiteは版の確認だけ
+    import numpy as np
+
+    with _lock:
+        version = get_data_version(user_id)
+        snap = _snapshots.get(user_id) or _read(user_id)
+        if snap is not None and snap["version"] == version:
+            _snapshots[user_id] = snap
+            return snap
+
+        if snap is None or snap["version"] > version:
+            # 初回（DBを入れ替えた時も）は全部読む
+            snap = _append_rows(_empty(), iter_shift_rows(user_id))
+            snap["version"] = version
+        else:
+            changes = fetch_changes_since(snap["version"], user_id)
+            ids = sorted({c["event_id"] for c in changes if c["event_id"] is not None})
+            keep = ~np.isin(snap["id"], ids)
+            kept = {k: snap[k][keep] for k in _COLUMNS}
+            kept.update(workplaces=snap["workplaces"], version=snap["version"])
+            snap = _append_rows(kept, iter_shift_rows(user_id, ids))
+            snap["version"] = max((c["version"] for c in changes), default=version)
+
+        _write(user_id, snap)
+        _snapshots[user_id] = snap
+        return snap
+
+
+# ---------- Aggregations ----------
+def _select(snap: dict, category: str, wages: dict[str, int]):
+    import numpy as np
+
+    m = snap["category"] == CATEGORY_CODES[category]
+    wage = np.array([wages.get(w, 0) for w in snap["workplaces"]] or [0], dtype=np.float64)
+    hours = snap["minutes"][m] / 60.0
+    return m, hours, hours * wage[snap["wp"][m]]
+
+
+def monthly_totals(snap: dict, wages: dict[str, int], category: str = "work") -> list[dict]:
+    import numpy as np
+
+    m, hours, income = _select(snap, category, wages)
+    months = snap["day"][m].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if len(months) == 0:
+        return []
+    keys, inv = np.unique(months, return_inverse=True)
+    h = np.bincount(inv, weights=hours)
+    inc = np.bincount(inv, weights=income)
+    n = np.bincount(inv)
+    return [
+        {"ym": f"{1970 + k // 12}-{k % 12 + 1:02d}", "shifts": int(n[i]),
+         "hours": float(h[i]), "income": int(round(inc[i]))}
+        for i, k in enumerate(keys)
+    ]
+
+
+def yearly_totals(snap: dict, wages: dict[str, int], category: str = "work") -> list[dict]:
+    out: dict[str, dict] = {}
+    for r in monthly_totals(snap, wages, category):
+        y = out.setdefault(r["ym"][:4], {"year": r["ym"][:4], "shifts": 0, "hours": 0.0, "income": 0})
+        y["shifts"] += r["shifts"]
+        y["hours"] += r["hours"]
+        y["income"] += r["income"]
+    return list(out.values())
+
+
+def workplace_rates(snap: dict, wages: dict[str, int], category: str = "work") -> list[dict]:
+    import numpy as np
+
+    m, hours, income = _select(snap, category, wages)
+    wp = snap["wp"][m]
+    k = len(snap["workplaces"])
+    n = np.bincount(wp, minlength=k)
+    h = np.bincount(wp, weights=hours, minlength=k)
+    inc = np.bincount(wp, weights=income, minlength=k)
+    return [
+        {"workplace": w, "shifts": int(n[i]), "hours": float(h[i]), "income": int(round(inc[i])),
+         "hours_per_shift": float(h[i] / n[i]), "yen_per_hour": float(inc[i] / h[i]) if h[i] else 0.0}
+        for i, w in enumerate(snap["workplaces"]) if n[i]
+    ]
+
+
+def weekday_heatmap(snap: dict, category: str = "work"):
+    # 曜日(月=0) × 時刻(0〜23時) ごとの勤務時間。シフトを1時間ごとに切って数える
+    import numpy as np
+
+    m = snap["category"] == CATEGORY_CODES[category]
+    weekday = (snap["day"][m].astype(np.int64) + 3) % 7  # 1970-01-01 は木曜
+    start = snap["start_min"][m].astype(np.int64)
+    end = start + snap["minutes"][m]
+    heat = np.zeros((7, 24))
+    for h in range(24):
+        overlap = np.clip(np.minimum(end, (h + 1) * 60) - np.maximum(start, h * 60), 0, None)
+        heat[:, h] = np.bincount(weekday, weights=overlap / 60.0, minlength=7)
+    return heat
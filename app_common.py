@@ -0,0 +1,28 @@
+from __future__ import annotations
+from time import perf_counter
+
+import streamlit as st
+
+from db import DEFAULT_USER, init_db
+
+
+# ---------- Shared page helpers ----------
+# 各ページで同じものを使う（ページごとに定義すると cache_resource も別になる）
+@st.cache_resource
+def init_db_once() -> float:
+    # DDLはサーバープロセスごとに1回だけ（かかった ms を返す）
+    t0 = perf_counter()
+    init_db()
+    return (perf_counter() - t0) * 1000
+
+
+def current_user() -> str:
+    return (st.session_state.get("user_id") or "").strip() or DEFAULT_USER
+
+
+def user_selector() -> str:
+    # ユーザー（URLの ?user=xxx でも指定できる）
+    if "user_id" not in st.session_state:
+        st.session_state["user_id"] = st.query_params.get("user", DEFAULT_USER)
+    st.sidebar.text_input("ユーザー", key="user_id")
+    return current_user()
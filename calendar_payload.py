@@ -0,0 +1,53 @@
+from __future__ import annotations
+import hashlib
+import json
+
+# proposalは店名(place)で色分け
+PROPOSAL_COLORS = {
+    "サンマルク": {"backgroundColor": "#FFCC80", "borderColor": "#FB8C00", "textColor": "#000000"},
+    "成城石井": {"backgroundColor": "#FC7B71F5", "borderColor": "#CB886E", "textColor": "#000000"},
+}
+
+
+# ---------- Calendar payload ----------
+def format_event_label(ev):
+    prefix = "✅ " if ev["category"] == "work" else ""
+    name = ev["place"] or ev["title"]  # 店名優先
+    if ev["start"] and ev["end"]:
+        return f'{prefix}{ev["start"]}-{ev["end"]} {name}'
+    return f'{prefix}{name}'
+
+
+def build_fc_events(events_by_date: dict[str, list[dict]]) -> list[dict]:
+    # 月の予定 → FullCalendar の events（入力だけで決まる純粋関数）
+    fc_events = []
+    for day_key, evs in events_by_date.items():
+        for ev in evs:
+            if ev["start"] and ev["end"]:
+                start = f"{day_key}T{ev['start']}:00"
+                end = f"{day_key}T{ev['end']}:00"
+                all_day_flag = False
+            else:
+                start = day_key
+                end = day_key
+                all_day_flag = True
+
+            item = {
+                "id": str(ev["id"]),
+                "title": format_event_label(ev),
+                "start": start,
+                "end": end,
+                "allDay": all_day_flag,
+            }
+
+            if ev["category"] == "proposal" and ev["place"] in PROPOSAL_COLORS:
+                item.update(PROPOSAL_COLORS[ev["place"]])
+
+            fc_events.append(item)
+    return fc_events
+
+
+def payload_hash(fc_events: list[dict]) -> str:
+    # 中身が同じなら同じ値。カレンダーのkeyに使い、同じ内容での再マウントを避ける
+    raw = json.dumps(fc_events, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
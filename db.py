@@ -0,0 +1,791 @@
+from __future__ import annotations
+import calendar
+import os
+import sqlite3
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import date
+from typing import Callable, Iterator, Optional
+
+from writer import get_writer
+
+DB_PATH = "app.db"
+ARCHIVE_DB_PATH = "archive.db"
+DEFAULT_ARCHIVE_HORIZON_MONTHS = 12
+DEFAULT_USER = "default"
+# 範囲読み出しで1回に取り出す行数
+EVENT_CHUNK_SIZE = 1000
+# 書き込みの完了を待つ上限（秒）。SQLiteのロック待ち（30秒）より長く
+WRITE_TIMEOUT_S = 60
+
+EVENT_COLUMNS = "id, ev_date, start_time, end_time, category, title, place"
+# アーカイブとの移動用（user_idも含めて丸ごと）
+EVENT_ALL_COLUMNS = "id, user_id, ev_date, start_time, end_time, category, title, place"
+
+
+# ---------- DB ----------
+def get_conn():
+    return sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+
+
+def submit_write(fn: Callable[[sqlite3.Cursor], object], archive: bool = False) -> Future:
+    # 書き込みは専用スレッドへ。Futureはcommit後に完了する
+    return get_writer(DB_PATH, ARCHIVE_DB_PATH).submit(fn, archive=archive)
+
+
+def _write(fn: Callable[[sqlite3.Cursor], object], archive: bool = False):
+    # 書き込みスレッドが詰まっても画面が固まらないよう、待つのは WRITE_TIMEOUT_S まで
+    try:
+        return submit_write(fn, archive=archive).result(timeout=WRITE_TIMEOUT_S)
+    except FutureTimeoutError:
+        raise sqlite3.OperationalError(f"書き込みが{WRITE_TIMEOUT_S}秒以内に終わりませんでした") from None
+
+
+def _row_to_event(r) -> dict:
+    return {
+        "id": r[0],
+        "date": r[1],
+        "start": r[2],
+        "end": r[3],
+        "category": r[4],
+        "title": r[5],
+        "place": r[6],
+    }
+
+
+def _columns(cur, table: str, schema: str = "main") -> list[str]:
+    return [r[1] for r in cur.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _create_tenant_table(cur, table: str, create_sql: str):
+    # user_id のない旧テーブルは作り直して DEFAULT_USER の行として移す
+    old_cols = _columns(cur, table)
+    if not old_cols or "user_id" in old_cols:
+        cur.execute(create_sql)
+        return
+    cur.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    cur.execute(create_sql)
+    copy_cols = ", ".join(c for c in _columns(cur, table) if c in old_cols)
+    cur.execute(
+        f"INSERT INTO {table} (user_id, {copy_cols}) SELECT ?, {copy_cols} FROM {table}_old",
+        (DEFAULT_USER,),
+    )
+    cur.execute(f"DROP TABLE {table}_old")
+
+
+def init_db():
+    conn = get_conn()
+    cur = conn.cursor()
+    # 書き込みは1スレッドに集約し、読み込みはWALで並行させる
+    cur.execute("PRAGMA journal_mode=WAL")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ev_date TEXT NOT NULL,          -- YYYY-MM-DD
+        start_time TEXT,                -- HH:MM (nullable, 終日はNULLでもOK)
+        end_time TEXT,                  -- HH:MM
+        category TEXT NOT NULL,          -- class / job / private / work / proposal
+        title TEXT NOT NULL,
+        place TEXT,                      -- store名など（任意）
+        user_id TEXT NOT NULL DEFAULT 'default'
+    );
+    """)
+    if "user_id" not in _columns(cur, "events"):
+        cur.execute("ALTER TABLE events ADD COLUMN user_id TEXT NOT NULL DEFAULT 'default'")
+
+    # ユーザー先頭のインデックス（ユーザーが増えても1人分の範囲だけ読む）
+    cur.execute("DROP INDEX IF EXISTS idx_events_date")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_user_date ON events(user_id, ev_date, start_time)")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS availability (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        workplace TEXT NOT NULL,         -- サンマルク / 成城石井
+        day_type TEXT NOT NULL,          -- weekday / weekend / dow
+        dow INTEGER,                     -- 0=Mon..6=Sun（day_type='dow'の時だけ）
+        start_time TEXT NOT NULL,        -- HH:MM
+        end_time TEXT NOT NULL,          -- HH:MM
+        user_id TEXT NOT NULL DEFAULT 'default'
+    );
+    """)
+    if "user_id" not in _columns(cur, "availability"):
+        cur.execute("ALTER TABLE availability ADD COLUMN user_id TEXT NOT NULL DEFAULT 'default'")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_availability_user ON availability(user_id, workplace)")
+
+    _create_tenant_table(cur, "settings", """
+    CREATE TABLE IF NOT EXISTS settings (
+        user_id TEXT PRIMARY KEY,
+        max_hours_per_day INTEGER,
+        max_hours_per_week INTEGER,
+        archive_horizon_months INTEGER
+    );
+    """)
+    cur.execute("""
+    INSERT OR IGNORE INTO settings (user_id, max_hours_per_day, max_hours_per_week)
+    VALUES (?, 6, 20);
+    """, (DEFAULT_USER,))
+
+    _create_tenant_table(cur, "wages", """
+    CREATE TABLE IF NOT EXISTS wages (
+        user_id TEXT NOT NULL,
+        workplace TEXT NOT NULL,
+        hourly_wage INTEGER NOT NULL,
+        PRIMARY KEY (user_id, workplace)
+    );
+    """)
+
+    # アーカイブ済みの月はここに集計行だけ残す
+    _create_tenant_table(cur, "month_summaries", """
+    CREATE TABLE IF NOT EXISTS month_summaries (
+        user_id TEXT NOT NULL,
+        ym TEXT NOT NULL,                -- YYYY-MM
+        category TEXT NOT NULL,
+        place TEXT NOT NULL DEFAULT '',
+        n_events INTEGER NOT NULL,
+        minutes INTEGER NOT NULL,        -- 時間指定のある予定の合計（分）
+        PRIMARY KEY (user_id, ym, category, place)
+    );
+    """)
+
+    # 変更ログ（eventsへの書き込みをトリガーで記録。versionは単調増加）
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS events_changes (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        op TEXT NOT NULL,                -- insert / update / delete / archive
+        event_id INTEGER NOT NULL,
+        ev_date TEXT NOT NULL,
+        category TEXT,
+        user_id TEXT NOT NULL
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_changes_user_version ON events_changes(user_id, version)")
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS events_changes_ai AFTER INSERT ON events
+    BEGIN
+        INSERT INTO events_changes (op, event_id, ev_date, category, user_id)
+        VALUES ('insert', NEW.id, NEW.ev_date, NEW.category, NEW.user_id);
+    END;
+    """)
+    # 日付・種別が変わった時は変更前の日付も記録する（どちらの日も影響を受ける）
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS events_changes_au_old AFTER UPDATE ON events
+    WHEN OLD.ev_date IS NOT NEW.ev_date OR OLD.category IS NOT NEW.category
+         OR OLD.user_id IS NOT NEW.user_id
+    BEGIN
+        INSERT INTO events_changes (op, event_id, ev_date, category, user_id)
+        VALUES ('update', OLD.id, OLD.ev_date, OLD.category, OLD.user_id);
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS events_changes_au AFTER UPDATE ON events
+    BEGIN
+        INSERT INTO events_changes (op, event_id, ev_date, category, user_id)
+        VALUES ('update', NEW.id, NEW.ev_date, NEW.category, NEW.user_id);
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS events_changes_ad AFTER DELETE ON events
+    BEGIN
+        INSERT INTO events_changes (op, event_id, ev_date, category, user_id)
+        VALUES ('delete', OLD.id, OLD.ev_date, OLD.category, OLD.user_id);
+    END;
+    """)
+
+    # 最後に提案を作った時点の版とseedと設定の指紋（差分の再提案で使う）
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS proposal_runs (
+        user_id TEXT NOT NULL,
+        ym TEXT NOT NULL,                -- YYYY-MM
+        version INTEGER NOT NULL,
+        seed INTEGER NOT NULL,
+        params TEXT NOT NULL DEFAULT '', -- 上限・時給・曜日・エンジンの指紋
+        PRIMARY KEY (user_id, ym)
+    );
+    """)
+    if "params" not in _columns(cur, "proposal_runs"):
+        cur.execute("ALTER TABLE proposal_runs ADD COLUMN params TEXT NOT NULL DEFAULT ''")
+
+    conn.commit()
+
+    # アーカイブの表はここで1回だけ用意する（無ければ最初の archive_old_months で作る）
+    if os.path.exists(ARCHIVE_DB_PATH):
+        _attach_archive(conn)
+        _init_archive_schema(conn)
+        conn.commit()
+        conn.execute("DETACH DATABASE archive")
+    conn.close()
+    _tenant_cache.clear()
+
+
+# ---------- DB (per-user cache) ----------
+# 設定・時給はユーザーごとにプロセス内でキャッシュする（書き込み時に破棄）
+_tenant_cache: dict[tuple[str, str, str], object] = {}
+
+
+def _cached(kind: str, user_id: str, load: Callable[[], object]):
+    key = (DB_PATH, user_id, kind)
+    if key not in _tenant_cache:
+        _tenant_cache[key] = load()
+    return _tenant_cache[key]
+
+
+def _invalidate(kind: str, user_id: str):
+    _tenant_cache.pop((DB_PATH, user_id, kind), None)
+
+
+# ---------- DB (archive) ----------
+def _attach_archive(conn):
+    # 読み込みはATTACHだけ。表・索引は init_db と書き込みスレッドが用意する
+    conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+
+
+def _init_archive_schema(conn):
+    # ATTACH済みの接続で。古い archive.db もここで今の形にそろえる
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS archive.events (
+        id INTEGER PRIMARY KEY,
+        ev_date TEXT NOT NULL,
+        start_time TEXT,
+        end_time TEXT,
+        category TEXT NOT NULL,
+        title TEXT NOT NULL,
+        place TEXT,
+        user_id TEXT NOT NULL DEFAULT 'default'
+    );
+    """)
+    if "user_id" not in _columns(conn, "events", "archive"):
+        conn.execute("ALTER TABLE archive.events ADD COLUMN user_id TEXT NOT NULL DEFAULT 'default'")
+    conn.execute("DROP INDEX IF EXISTS archive.idx_archive_events_date")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS archive.idx_archive_events_user_date ON events(user_id, ev_date, start_time)"
+    )
+
+
+def get_archived_until(conn, user_id: str = DEFAULT_USER) -> Optional[str]:
+    # アーカイブ済みの最後の月（YYYY-MM）。未アーカイブならNone
+    row = conn.execute("SELECT MAX(ym) FROM month_summaries WHERE user_id=?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def is_month_archived(year: int, month: int, user_id: str = DEFAULT_USER) -> bool:
+    # アーカイブ済みの月の予定は archive.events にあり、提案の作成・確定・削除は main しか見ない
+    conn = get_conn()
+    archived_until = get_archived_until(conn, user_id)
+    conn.close()
+    return archived_until is not None and f"{year}-{month:02d}" <= archived_until
+
+
+def _events_source(conn, start_date: str, user_id: str = DEFAULT_USER) -> str:
+    # 範囲がアーカイブ済みの月にかかる時だけ archive.events を UNION する
+    archived_until = get_archived_until(conn, user_id)
+    if archived_until is None or start_date > f"{archived_until}-31" or not os.path.exists(ARCHIVE_DB_PATH):
+        return "events"
+    _attach_archive(conn)
+    return (
+        f"(SELECT {EVENT_ALL_COLUMNS} FROM main.events "
+        f"UNION ALL SELECT {EVENT_ALL_COLUMNS} FROM archive.events)"
+    )
+
+
+def _refresh_month_summary(cur, ym: str, user_id: str):
+    cur.execute("DELETE FROM month_summaries WHERE user_id=? AND ym=?", (user_id, ym))
+    cur.execute(
+        """
+        INSERT INTO month_summaries (user_id, ym, category, place, n_events, minutes)
+        SELECT ?, ?, category, COALESCE(place, ''), COUNT(*),
+               COALESCE(SUM(CAST(round((julianday(end_time) - julianday(start_time)) * 1440) AS INTEGER)), 0)
+        FROM archive.events
+        WHERE user_id = ? AND ev_date BETWEEN ? AND ?
+        GROUP BY category, COALESCE(place, '')
+        """,
+        (user_id, ym, user_id, f"{ym}-01", f"{ym}-31"),
+    )
+
+
+def archive_old_months(horizon_months: int, today: Optional[date] = None,
+                       user_id: str = DEFAULT_USER) -> int:
+    # horizon_months より前の月を archive.db へ移す（戻り値は移動件数）
+    today = today or date.today()
+    y, m = today.year, today.month - horizon_months
+    while m <= 0:
+        m += 12
+        y -= 1
+    cutoff = f"{y}-{m:02d}-01"
+    where = "user_id = ? AND ev_date <> '' AND ev_date < ?"
+
+    def op(cur):
+        cur.execute(
+            f"SELECT DISTINCT substr(ev_date, 1, 7) FROM main.events WHERE {where}",
+            (user_id, cutoff),
+        )
+        months = [r[0] for r in cur.fetchall()]
+        cur.execute(
+            f"""
+            INSERT INTO archive.events ({EVENT_ALL_COLUMNS})
+            SELECT {EVENT_ALL_COLUMNS} FROM main.events
+            WHERE {where}
+            """,
+            (user_id, cutoff),
+        )
+        moved = cur.rowcount
+        v0 = _max_version(cur)
+        cur.execute(f"DELETE FROM main.events WHERE {where}", (user_id, cutoff))
+        # 消えたのではなく移動しただけなので op を archive にしておく
+        cur.execute(
+            "UPDATE events_changes SET op='archive' WHERE version > ? AND op='delete'", (v0,)
+        )
+        for ym in months:
+            _refresh_month_summary(cur, ym, user_id)
+        return moved
+
+    return _write(op, archive=True)
+
+
+def get_month_summaries(user_id: str = DEFAULT_USER) -> list[dict]:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT ym, category, place, n_events, minutes
+        FROM month_summaries
+        WHERE user_id = ?
+        ORDER BY ym, category, place
+        """,
+        (user_id,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [
+        {"ym": r[0], "category": r[1], "place": r[2], "n_events": r[3], "minutes": r[4]}
+        for r in rows
+    ]
+
+
+def get_archive_horizon(user_id: str = DEFAULT_USER) -> int:
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT archive_horizon_months FROM settings WHERE user_id=?", (user_id,)
+    ).fetchone()
+    conn.close()
+    if not row or row[0] is None:
+        return DEFAULT_ARCHIVE_HORIZON_MONTHS
+    return int(row[0])
+
+
+def set_archive_horizon(months: int, user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        "INSERT INTO settings(user_id, archive_horizon_months) VALUES(?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET archive_horizon_months=excluded.archive_horizon_months",
+        (user_id, months),
+    ))
+
+
+def add_event(ev_date: str, start_time: Optional[str], end_time: Optional[str],
+             category: str, title: str, place: Optional[str] = None,
+             user_id: str = DEFAULT_USER) -> int:
+    def op(cur):
+        cur.execute(
+            """
+            INSERT INTO events (user_id, ev_date, start_time, end_time, category, title, place)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (user_id, ev_date, start_time, end_time, category, title, place),
+        )
+        return cur.lastrowid
+
+    return _write(op)
+
+
+def add_events(rows: list[tuple], user_id: str = DEFAULT_USER) -> list[int]:
+    # rows: (ev_date, start_time, end_time, category, title, place) をまとめて1回で書く
+    def op(cur):
+        ids = []
+        for r in rows:
+            cur.execute(
+                """
+                INSERT INTO events (user_id, ev_date, start_time, end_time, category, title, place)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, *r),
+            )
+            ids.append(cur.lastrowid)
+        return ids
+
+    return _write(op)
+
+
+def delete_event(event_id: int, user_id: str = DEFAULT_USER):
+    has_archive = os.path.exists(ARCHIVE_DB_PATH)
+
+    def op(cur):
+        cur.execute("DELETE FROM main.events WHERE id = ? AND user_id = ?", (event_id, user_id))
+        if cur.rowcount == 0 and has_archive:
+            # アーカイブ済みの予定
+            row = cur.execute(
+                "SELECT ev_date, category FROM archive.events WHERE id = ? AND user_id = ?", (event_id, user_id)
+            ).fetchone()
+            if row:
+                cur.execute("DELETE FROM archive.events WHERE id = ?", (event_id,))
+                _refresh_month_summary(cur, row[0][:7], user_id)
+                _log_change(cur, "delete", event_id, row[0], row[1], user_id)
+
+    _write(op, archive=has_archive)
+
+
+def update_event(event_id: int, ev_date: str, start_time: Optional[str], end_time: Optional[str],
+                 category: str, title: str, place: Optional[str] = None,
+                 user_id: str = DEFAULT_USER):
+    has_archive = os.path.exists(ARCHIVE_DB_PATH)
+
+    def op(cur):
+        cur.execute(
+            """
+            UPDATE main.events
+            SET ev_date=?, start_time=?, end_time=?, category=?, title=?, place=?
+            WHERE id=? AND user_id=?
+            """,
+            (ev_date, start_time, end_time, category, title, place, event_id, user_id),
+        )
+        if cur.rowcount == 0 and has_archive:
+            # アーカイブ済みの予定はホットDBへ戻してから更新する
+            row = cur.execute(
+                "SELECT ev_date, category FROM archive.events WHERE id = ? AND user_id = ?", (event_id, user_id)
+            ).fetchone()
+            if row:
+                cur.execute(
+                    f"""
+                    INSERT INTO main.events ({EVENT_ALL_COLUMNS})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (event_id, user_id, ev_date, start_time, end_time, category, title, place),
+                )
+                cur.execute("DELETE FROM archive.events WHERE id = ?", (event_id,))
+                _refresh_month_summary(cur, row[0][:7], user_id)
+                _log_change(cur, "update", event_id, row[0], row[1], user_id)
+
+    _write(op, archive=has_archive)
+
+
+def fetch_events_in_month(year: int, month: int, user_id: str = DEFAULT_USER):
+    start = f"{year}-{month:02d}-01"
+    last_day = calendar.monthrange(year, month)[1]
+    end = f"{year}-{month:02d}-{last_day:02d}"
+
+    by_date = {}
+    for ev in fetch_events_between(start, end, user_id):
+        by_date.setdefault(ev["date"], []).append(ev)
+    return by_date
+
+
+def iter_events_between(start_date: str, end_date: str, user_id: str = DEFAULT_USER,
+                        chunk_size: int = EVENT_CHUNK_SIZE) -> Iterator[list[tuple]]:
+    # (id, ev_date, start_time, end_time, category, title, place) のタプルを chunk_size 件ずつ返す。
+    # カーソルで少しずつ読むので、1年分でも手元に持つのは1チャンクだけ
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        src = _events_source(conn, start_date, user_id)
+        cur.execute(
+            f"""
+            SELECT {EVENT_COLUMNS}
+            FROM {src}
+            WHERE user_id = ? AND ev_date BETWEEN ? AND ?
+            ORDER BY ev_date ASC, start_time ASC
+            """,
+            (user_id, start_date, end_date),
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def fetch_events_between(start_date: str, end_date: str, user_id: str = DEFAULT_USER):
+    return [_row_to_event(r) for rows in iter_events_between(start_date, end_date, user_id) for r in rows]
+
+def fetch_event_by_id(event_id: int, user_id: str = DEFAULT_USER) -> Optional[dict]:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT {EVENT_COLUMNS}
+        FROM events
+        WHERE id = ? AND user_id = ?
+        """,
+        (event_id, user_id),
+    )
+    r = cur.fetchone()
+    if not r and os.path.exists(ARCHIVE_DB_PATH):
+        _attach_archive(conn)
+        cur.execute(
+            f"SELECT {EVENT_COLUMNS} FROM archive.events WHERE id = ? AND user_id = ?",
+            (event_id, user_id),
+        )
+        r = cur.fetchone()
+    conn.close()
+    if not r:
+        return None
+    return _row_to_event(r)
+
+
+def iter_shift_rows(user_id: str = DEFAULT_USER, event_ids: Optional[list[int]] = None,
+                    chunk_size: int = EVENT_CHUNK_SIZE) -> Iterator[list[tuple]]:
+    # 分析用：勤務・提案の (id, ev_date, start_time, end_time, category, 店) をアーカイブ込みで
+    # chunk_size 件ずつ。event_ids を渡すとその予定だけ（変わった分の取り直し）
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        src = _events_source(conn, "0000-00-00", user_id)
+        sql = f"""
+            SELECT id, ev_date, start_time, end_time, category,
+                   COALESCE(NULLIF(place, ''), NULLIF(title, ''), '不明')
+            FROM {src}
+            WHERE user_id = ? AND category IN ('work', 'proposal')
+              AND start_time IS NOT NULL AND end_time IS NOT NULL
+        """
+        if event_ids is None:
+            batches = [(sql, (user_id,))]
+        else:
+            batches = [
+                (f"{sql} AND id IN ({','.join('?' * len(chunk))})", (user_id, *chunk))
+                for chunk in (event_ids[i:i + 500] for i in range(0, len(event_ids), 500))
+            ]
+        for q, params in batches:
+            cur.execute(q, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    finally:
+        conn.close()
+
+
+# ---------- DB (change feed) ----------
+def _max_version(cur) -> int:
+    return cur.execute("SELECT COALESCE(MAX(version), 0) FROM events_changes").fetchone()[0]
+
+
+def _log_change(cur, op: str, event_id: int, ev_date: str, category: Optional[str], user_id: str):
+    # archive.events への直接の変更はトリガーが拾わないので手で記録する
+    cur.execute(
+        """
+        INSERT INTO events_changes (op, event_id, ev_date, category, user_id)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (op, event_id, ev_date, category, user_id),
+    )
+
+
+def get_data_version(user_id: str = DEFAULT_USER) -> int:
+    # ユーザーの予定が最後に変わった版。これだけポーリングすれば外部の変更に気付ける
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM events_changes WHERE user_id=?", (user_id,)
+    ).fetchone()
+    conn.close()
+    return int(row[0])
+
+
+def fetch_changes_since(version: int, user_id: str = DEFAULT_USER) -> list[dict]:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT version, op, event_id, ev_date, category
+        FROM events_changes
+        WHERE user_id = ? AND version > ?
+        ORDER BY version
+        """,
+        (user_id, version),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [
+        {"version": r[0], "op": r[1], "event_id": r[2], "date": r[3], "category": r[4]}
+        for r in rows
+    ]
+
+
+def changed_dates_since(version: int, user_id: str = DEFAULT_USER,
+                        categories: Optional[tuple[str, ...]] = None) -> set[str]:
+    return {
+        c["date"] for c in fetch_changes_since(version, user_id)
+        if c["date"] and (categories is None or c["category"] in categories)
+    }
+
+
+def get_proposal_run(ym: str, user_id: str = DEFAULT_USER) -> Optional[tuple[int, int, str]]:
+    # (version, seed, params)。まだ提案を作っていなければNone
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT version, seed, params FROM proposal_runs WHERE user_id=? AND ym=?", (user_id, ym)
+    ).fetchone()
+    conn.close()
+    return (int(row[0]), int(row[1]), row[2]) if row else None
+
+
+def set_proposal_run(ym: str, version: int, seed: int, params: str, user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        "INSERT INTO proposal_runs(user_id, ym, version, seed, params) VALUES(?, ?, ?, ?, ?) "
+        "ON CONFLICT(user_id, ym) DO UPDATE SET "
+        "version=excluded.version, seed=excluded.seed, params=excluded.params",
+        (user_id, ym, version, seed, params),
+    ))
+
+
+# ---------- DB (proposal config) ----------
+def upsert_settings(max_day: int, max_week: int, user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        "INSERT INTO settings(user_id, max_hours_per_day, max_hours_per_week) VALUES(?, ?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET "
+        "max_hours_per_day=excluded.max_hours_per_day, max_hours_per_week=excluded.max_hours_per_week",
+        (user_id, max_day, max_week),
+    ))
+    _invalidate("settings", user_id)
+
+
+def get_settings(user_id: str = DEFAULT_USER) -> tuple[int, int]:
+    def load():
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT max_hours_per_day, max_hours_per_week FROM settings WHERE user_id=?", (user_id,)
+        )
+        row = cur.fetchone()
+        conn.close()
+        if not row:
+            return 6, 20
+        return int(row[0] or 6), int(row[1] or 20)
+
+    return _cached("settings", user_id, load)
+
+
+def upsert_wage(workplace: str, hourly_wage: int, user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        "INSERT INTO wages(user_id, workplace, hourly_wage) VALUES(?, ?, ?) "
+        "ON CONFLICT(user_id, workplace) DO UPDATE SET hourly_wage=excluded.hourly_wage",
+        (user_id, workplace, hourly_wage),
+    ))
+    _invalidate("wages", user_id)
+
+
+def get_wages(user_id: str = DEFAULT_USER) -> dict[str, int]:
+    def load():
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute("SELECT workplace, hourly_wage FROM wages WHERE user_id=?", (user_id,))
+        rows = cur.fetchall()
+        conn.close()
+        return {r[0]: int(r[1]) for r in rows}
+
+    return dict(_cached("wages", user_id, load))
+
+
+def add_availability(workplace: str, day_type: str, dow: Optional[int], start_time: str, end_time: str,
+                     user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        """
+        INSERT INTO availability(user_id, workplace, day_type, dow, start_time, end_time)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (user_id, workplace, day_type, dow, start_time, end_time),
+    ))
+
+
+def delete_availability(avail_id: int, user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        "DELETE FROM availability WHERE id=? AND user_id=?", (avail_id, user_id)
+    ))
+
+
+def get_availabilities(user_id: str = DEFAULT_USER) -> list[dict]:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, workplace, day_type, dow, start_time, end_time
+        FROM availability
+        WHERE user_id = ?
+        ORDER BY workplace, day_type, dow, start_time
+        """,
+        (user_id,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return [
+        {
+            "id": r[0],
+            "workplace": r[1],
+            "day_type": r[2],
+            "dow": r[3],
+            "start_time": r[4],
+            "end_time": r[5],
+        }
+        for r in rows
+    ]
+
+
+def delete_proposals_in_range(start_date: str, end_date: str, user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        """
+        DELETE FROM events
+        WHERE user_id=? AND category='proposal' AND ev_date BETWEEN ? AND ?
+        """,
+        (user_id, start_date, end_date),
+    ))
+
+
+def reconcile_proposals(ranges: list[tuple[str, str]], picks: list[dict],
+                        user_id: str = DEFAULT_USER) -> tuple[list[int], list[int]]:
+    # 範囲内の既存proposalと (date, start, end, workplace) で突き合わせ、
+    # 差分だけを1トランザクションで反映する。変わらない行はidもそのまま
+    def op(cur):
+        existing: dict[tuple, list[int]] = {}
+        for start_date, end_date in ranges:
+            cur.execute(
+                """
+                SELECT id, ev_date, start_time, end_time, place
+                FROM events
+                WHERE user_id=? AND category='proposal' AND ev_date BETWEEN ? AND ?
+                ORDER BY id
+                """,
+                (user_id, start_date, end_date),
+            )
+            for r in cur.fetchall():
+                existing.setdefault((r[1], r[2], r[3], r[4]), []).append(r[0])
+
+        added = []
+        for p in picks:
+            key = (p["date"], p["start"], p["end"], p["workplace"])
+            if existing.get(key):
+                existing[key].pop(0)
+                continue
+            cur.execute(
+                """
+                INSERT INTO events (user_id, ev_date, start_time, end_time, category, title, place)
+                VALUES (?, ?, ?, ?, 'proposal', ?, ?)
+                """,
+                (user_id, p["date"], p["start"], p["end"], p["workplace"], p["workplace"]),
+            )
+            added.append(cur.lastrowid)
+
+        removed = [i for ids in existing.values() for i in ids]
+        cur.executemany("DELETE FROM events WHERE id=?", [(i,) for i in removed])
+        return added, removed
+
+    return _write(op)
+
+
+def convert_proposals_to_work(start_date: str, end_date: str, user_id: str = DEFAULT_USER):
+    _write(lambda cur: cur.execute(
+        """
+        UPDATE events
+        SET category='work'
+        WHERE user_id=? AND category='proposal' AND ev_date BETWEEN ? AND ?
+        """,
+        (user_id, start_date, end_date),
+    ))
@@ -0,0 +1,272 @@
+from __future__ import annotations
+import calendar
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+
+SHIFT_TEMPLATES = {
+    "成城石井": [("10:00", "14:00"), ("17:00", "22:00"), ("18:00", "22:00")],
+    "サンマルク": [
+        ("10:00", "16:00"), ("11:00", "17:00"), ("12:00", "18:00"),
+        ("13:00", "19:00"), ("14:00", "20:00"), ("16:00", "22:00"),
+        ("14:00", "18:00"), ("17:00", "22:00"), ("18:00", "22:00"),
+    ],
+}
+BUFFER_BEFORE_AFTER_MIN = 60
+TRAVEL_BETWEEN_WORKPLACES_MIN = 60
+WORKDAY_PENALTY = 250
+BUSY_DAY_PENALTY = 3000
+BUSY_DAY_PENALTY_STM = 7000
+DAY_HOURS_PENALTY = 50
+BUSY_CATEGORIES = ("class", "job", "private", "work", "proposal")
+
+
+# ---------- Proposal logic ----------
+def _t(s: str) -> time:
+    return datetime.strptime(s, "%H:%M").time()
+
+def monday_of(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+def month_range(year: int, month: int) -> tuple[date, date]:
+    first = date(year, month, 1)
+    last_day = calendar.monthrange(year, month)[1]
+    last = date(year, month, last_day)
+    return first, last
+
+def iter_week_starts_in_month(year: int, month: int) -> list[date]:
+    first, last = month_range(year, month)
+    start = monday_of(first)
+    week_starts = []
+    d = start
+    while d <= last:
+        week_starts.append(d)
+        d += timedelta(days=7)
+    return week_starts
+
+
+def month_horizon(year: int, month: int) -> tuple[date, date]:
+    # 月にかかる週（月曜始まり）を丸ごと覆う期間
+    week_starts = iter_week_starts_in_month(year, month)
+    return week_starts[0], week_starts[-1] + timedelta(days=6)
+
+
+def _to_dt(d: date, hm: str) -> datetime:
+    return datetime.combine(d, _t(hm))
+
+
+def _overlaps(a_s: datetime, a_e: datetime, b_s: datetime, b_e: datetime) -> bool:
+    return (a_s < b_e) and (b_s < a_e)
+
+
+def busy_events(events: list[dict]) -> list[dict]:
+    return [e for e in events if e["category"] in BUSY_CATEGORIES]
+
+
+# ---------- Busy index ----------
+# 日付ごとに、予定のある時間帯（分）を開始順に並べて重なりをまとめたもの。
+# 終日の予定（開始か終了が無い）は (0, 1440)
+DAY_MINUTES = 24 * 60
+BusyIndex = dict[str, list[tuple[int, int]]]
+
+
+def _minutes(hm: str) -> int:
+    h, m = hm.split(":")
+    return int(h) * 60 + int(m)
+
+
+def _merge_into(day: list[tuple[int, int]], s: int, e: int):
+    k = bisect_left(day, (s, e))
+    day.insert(k, (s, e))
+    # 前後の重なる区間とまとめる（接しているだけでも1つにする）
+    if k > 0 and day[k - 1][1] >= s:
+        k -= 1
+    ms, me = day[k]
+    j = k + 1
+    while j < len(day) and day[j][0] <= me:
+        me = max(me, day[j][1])
+        j += 1
+    day[k:j] = [(ms, me)]
+
+
+def add_busy(index: BusyIndex, ds: str, start: str | None, end: str | None):
+    if start is None or end is None:
+        s, e = 0, DAY_MINUTES
+    else:
+        s, e = _minutes(start), _minutes(end)
+        if e < s:
+            return
+    _merge_into(index.setdefault(ds, []), s, e)
+
+
+def build_busy_index(events: list[dict]) -> BusyIndex:
+    index: BusyIndex = {}
+    for b in busy_events(events):
+        if b.get("date"):
+            add_busy(index, b["date"], b["start"], b["end"])
+    return index
+
+
+def overlaps_busy(index: BusyIndex, ds: str, s: int, e: int) -> bool:
+    # 開区間 (s, e) がどれかの予定と重なるか
+    day = index.get(ds)
+    if not day:
+        return False
+    k = bisect_left(day, (e,))
+    if k == 0:
+        return False
+    # 開始がe未満の区間のうち終了が一番遅いのは、まとめてあるので直前の区間
+    return s < day[k - 1][1]
+
+
+def _is_busy_with_buffer(busy: BusyIndex, d: date, s: str, e: str) -> bool:
+    return overlaps_busy(
+        busy, d.strftime("%Y-%m-%d"),
+        _minutes(s) - BUFFER_BEFORE_AFTER_MIN, _minutes(e) + BUFFER_BEFORE_AFTER_MIN,
+    )
+
+
+def shifts_conflict(a: dict, b: dict) -> bool:
+    # 同じ日の2つのシフトが両立しないか（同じ店なら重なり、別の店なら移動時間）
+    if a["date"] != b["date"]:
+        return False
+    d = datetime.strptime(a["date"], "%Y-%m-%d").date()
+    ss = _to_dt(d, a["start"])
+    ee = _to_dt(d, a["end"])
+    ps = _to_dt(d, b["start"])
+    pe = _to_dt(d, b["end"])
+
+    if a["workplace"] == b["workplace"]:
+        return _overlaps(ss, ee, ps, pe)
+    gap1 = (ss - pe).total_seconds() / 60
+    gap2 = (ps - ee).total_seconds() / 60
+    return not (gap1 >= TRAVEL_BETWEEN_WORKPLACES_MIN or gap2 >= TRAVEL_BETWEEN_WORKPLACES_MIN)
+
+
+def build_week_candidates(
+    week_start_date: date,
+    wages: dict[str, int],
+    events: list[dict],
+    avail_days: dict[str, list[bool]] | None = None,
+    allowed_dates: set[str] | None = None,
+    busy_index: BusyIndex | None = None,
+) -> list[dict]:
+    # ---- 候補生成（固定枠＋曜日ON/OFF）----
+    # busy_index を渡せば events から作り直さない
+    busy = busy_index if busy_index is not None else build_busy_index(events)
+    candidates = []
+    for i in range(7):
+        d = week_start_date + timedelta(days=i)
+        dow = d.weekday()
+        ds = d.strftime("%Y-%m-%d")
+        if allowed_dates is not None and ds not in allowed_dates:
+            continue
+
+        for w, shifts in SHIFT_TEMPLATES.items():
+            # 曜日ON/OFF
+            if avail_days is not None and not avail_days.get(w, [True] * 7)[dow]:
+                continue
+
+            wage = wages.get(w, 0)
+
+            for (s, e) in shifts:
+                if w == "サンマルク" and dow == 1 and e == "22:00":
+                    continue
+
+                if _is_busy_with_buffer(busy, d, s, e):
+                    continue
+
+                hours = int((_to_dt(d, e) - _to_dt(d, s)).total_seconds() // 3600)
+                candidates.append({
+                    "date": ds,
+                    "start": s,
+                    "end": e,
+                    "workplace": w,
+                    "hours": hours,
+                    "income": hours * wage,
+                })
+    return candidates
+
+
+def busy_day_penalty(c: dict, busy_days: set[str]) -> int:
+    if c["date"] not in busy_days:
+        return 0
+    if c["workplace"] == "サンマルク":
+        return BUSY_DAY_PENALTY_STM
+    return BUSY_DAY_PENALTY
+
+
+def propose_week_fixed_slots(
+    week_start_date: date,
+    max_day: int,
+    max_week: int,
+    wages: dict[str, int],
+    events: list[dict],
+    seed: int = 0,
+    avail_days: dict[str, list[bool]] | None = None,
+    allowed_dates: set[str] | None = None,
+    week_hours_used: int = 0,
+    busy_index: BusyIndex | None = None,
+):
+    # allowed_dates: 候補を出す日（月をまたぐ週で自分の月の日だけ計画する時）
+    # week_hours_used: その週ですでに埋まっている時間（週上限から差し引く）
+    # busy_index: events から作った予定の索引（呼び出し側で使い回す時）
+    import random
+    rnd = random.Random(seed)
+
+    busy_days = {e["date"] for e in busy_events(events) if e.get("date")}
+    candidates = build_week_candidates(week_start_date, wages, events, avail_days, allowed_dates,
+                                       busy_index)
+
+    # ---- 選択（稼ぎ最大＋働く日の増加を少し抑える）----
+    picked = []
+    day_hours: dict[str, int] = {}
+    workdays = set()
+    total_hours = week_hours_used
+
+    def score(c):
+        sc = c["income"]
+        sc -= busy_day_penalty(c, busy_days)
+
+        if c["date"] not in workdays:
+            sc -= WORKDAY_PENALTY
+
+        sc -= day_hours.get(c["date"], 0) * DAY_HOURS_PENALTY
+        sc += rnd.randint(0, 30)
+        return sc
+
+
+    while True:
+        best = None
+        best_sc = -10**18
+
+        for c in candidates:
+            if total_hours + c["hours"] > max_week:
+                continue
+            if day_hours.get(c["date"], 0) + c["hours"] > max_day:
+                continue
+
+            if any(shifts_conflict(c, p) for p in picked):
+                continue
+
+            sc = score(c)
+            if sc > best_sc:
+                best_sc = sc
+                best = c
+
+        if best is None:
+            break
+
+        picked.append(best)
+        total_hours += best["hours"]
+        day_hours[best["date"]] = day_hours.get(best["date"], 0) + best["hours"]
+        workdays.add(best["date"])
+
+        candidates = [x for x in candidates if not (
+            x["date"] == best["date"]
+            and x["start"] == best["start"]
+            and x["end"] == best["end"]
+            and x["workplace"] == best["workplace"]
+        )]
+
+    picked.sort(key=lambda x: (x["date"], x["start"]))
+    return picked
@@ -0,0 +1,136 @@
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+
+from engine import (
+    add_busy, build_busy_index, iter_week_starts_in_month, month_range, propose_week_fixed_slots,
+)
+from optimizer import DEFAULT_BUDGET_MS, propose_week_local_search
+
+# 入出力の形を変えたら上げる（golden/ の記録もそれに合わせて取り直す）
+API_VERSION = 1
+
+ENGINE_GREEDY = "greedy"
+ENGINE_LOCAL_SEARCH = "local_search"
+# 隣の月の日で週上限に数える種別
+NEIGHBOUR_HOURS_CATEGORIES = ("work", "proposal")
+
+PLAN_KEYS = ("date", "start", "end", "workplace", "hours", "income")
+
+
+# ---------- Month plan ----------
+# DBにもStreamlitにも触らない提案の本体。入力が同じなら（貪欲法は）同じ計画を返す
+def week_seed(seed: int, week_index: int) -> int:
+    return seed + week_index * 101
+
+
+def neighbour_hours(events: list[dict], ws: date, allowed: set[str]) -> float:
+    # 週のうち隣の月の日に入っている勤務・提案の時間
+    week = {(ws + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)} - allowed
+    total = 0.0
+    for e in events:
+        if e["date"] in week and e["category"] in NEIGHBOUR_HOURS_CATEGORIES and e["start"] and e["end"]:
+            s = datetime.strptime(e["start"], "%H:%M")
+            t = datetime.strptime(e["end"], "%H:%M")
+            total += (t - s).total_seconds() / 3600
+    return total
+
+
+def plan_month(year: int, month: int, seed: int, events: list[dict],
+               wages: dict[str, int], max_day: int, max_week: int,
+               avail_days: dict[str, list[bool]] | None = None,
+               week_indices: set[int] | None = None,
+               engine: str = ENGINE_GREEDY, budget_ms: int = DEFAULT_BUDGET_MS) -> list[dict]:
+    # events は month_horizon 全体のスナップショット（呼び出し側のリストは変えない）。
+    # 各週は1回だけ、この月の日についてだけ計画し、
+    # 隣の月の日に入っている時間は週上限から差し引く
+    first, last = month_range(year, month)
+    events = list(events)  # 選んだ提案はこのコピーに足していく
+
+    # 予定の索引は1回だけ作り、選んだ提案を足しながら全週で使い回す
+    busy = build_busy_index(events)
+    picks = []
+    for wi, ws in enumerate(iter_week_starts_in_month(year, month)):
+        if week_indices is not None and wi not in week_indices:
+            continue
+        allowed = {
+            d.strftime("%Y-%m-%d")
+            for d in (ws + timedelta(days=i) for i in range(7))
+            if first <= d <= last
+        }
+        kwargs = dict(
+            week_start_date=ws,
+            max_day=max_day,
+            max_week=max_week,
+            wages=wages,
+            events=events,
+            seed=week_seed(seed, wi),
+            avail_days=avail_days,
+            allowed_dates=allowed,
+            week_hours_used=neighbour_hours(events, ws, allowed),
+            busy_index=busy,
+        )
+        if engine == ENGINE_LOCAL_SEARCH:
+            picked = propose_week_local_search(**kwargs, budget_ms=budget_ms)
+        else:
+            picked = propose_week_fixed_slots(**kwargs)
+
+        for p in picked:
+            picks.append(p)
+
+            # proposal同士も衝突扱いにするため追加
+            events.append({
+                "id": -1,
+                "date": p["date"],
+                "start": p["start"],
+                "end": p["end"],
+                "category": "proposal",
+                "title": p["workplace"],
+                "place": p["workplace"],
+            })
+            add_busy(busy, p["date"], p["start"], p["end"])
+    return picks
+
+
+# ---------- JSON contract ----------
+# request:
+#   {"api_version": 1, "year": 2026, "month": 2, "seed": 0,
+#    "max_day": 8, "max_week": 20, "wages": {"サンマルク": 1120, ...},
+#    "avail_days": null | {"サンマルク": [月..日のbool×7], ...},
+#    "events": [{"date": "YYYY-MM-DD", "start": "HH:MM"|null, "end": "HH:MM"|null,
+#                "category": "class"|"job"|"private"|"work"|"proposal"|...}],
+#    "engine": "greedy" | "local_search", "budget_ms": 200}
+#   events は月にかかる週全体（engine.month_horizon）の予定
+# response:
+#   {"api_version": 1, "plan": [{"date", "start", "end", "workplace", "hours", "income"}, ...]}
+#   plan は (date, start) 順
+def _check_request(req: dict):
+    if req.get("api_version", API_VERSION) != API_VERSION:
+        raise ValueError(f"api_version {req.get('api_version')} は未対応です（{API_VERSION}）")
+    for k in ("year", "month", "seed", "max_day", "max_week", "wages", "events"):
+        if k not in req:
+            raise ValueError(f"{k} がありません")
+    if req.get("engine", ENGINE_GREEDY) not in (ENGINE_GREEDY, ENGINE_LOCAL_SEARCH):
+        raise ValueError(f"engine {req['engine']} は未対応です")
+    for e in req["events"]:
+        if not {"date", "start", "end", "category"} <= e.keys():
+            raise ValueError(f"予定に date/start/end/category が足りません: {e}")
+
+
+def propose(req: dict) -> dict:
+    _check_request(req)
+    events = [
+        {"id": e.get("id", 0), "date": e["date"], "start": e["start"], "end": e["end"],
+         "category": e["category"], "title": e.get("title", ""), "place": e.get("place")}
+        for e in req["events"]
+    ]
+    plan = plan_month(
+        int(req["year"]), int(req["month"]), int(req["seed"]), events,
+        {k: int(v) for k, v in req["wages"].items()}, int(req["max_day"]), int(req["max_week"]),
+        req.get("avail_days"),
+        engine=req.get("engine", ENGINE_GREEDY),
+        budget_ms=int(req.get("budget_ms", DEFAULT_BUDGET_MS)),
+    )
+    return {
+        "api_version": API_VERSION,
+        "plan": [{k: p[k] for k in PLAN_KEYS} for p in sorted(plan, key=lambda x: (x["date"], x["start"]))],
+    }
@@ -0,0 +1,35 @@
+from __future__ import annotations
+import csv
+import io
+import tempfile
+from typing import BinaryIO, TextIO
+
+from db import DEFAULT_USER, iter_events_between
+
+CSV_HEADER = ("id", "date", "start", "end", "category", "title", "place")
+# これを超えたら一時ファイルをディスクに書き出す
+SPOOL_MAX_BYTES = 1 << 20
+
+
+# ---------- CSV export ----------
+def write_events_csv(fp: TextIO, start_date: str, end_date: str, user_id: str = DEFAULT_USER) -> int:
+    # チャンクごとに書くだけなので、期間が長くてもメモリは一定。書いた件数を返す
+    w = csv.writer(fp)
+    w.writerow(CSV_HEADER)
+    n = 0
+    for rows in iter_events_between(start_date, end_date, user_id):
+        w.writerows(rows)
+        n += len(rows)
+    return n
+
+
+def events_csv_file(start_date: str, end_date: str, user_id: str = DEFAULT_USER) -> BinaryIO:
+    # ダウンロード用（Excelで開けるようBOM付きUTF-8）。先頭に戻したファイルを返す。
+    # 作る間のメモリは一定だが、download_button はこれを全部読んでメモリに持つ
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    write_events_csv(text, start_date, end_date, user_id)
+    text.flush()
+    text.detach()
+    f.seek(0)
+    return f
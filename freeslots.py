@@ -0,0 +1,67 @@
+from __future__ import annotations
+from datetime import date, timedelta
+
+from db import DEFAULT_USER, iter_events_between
+from engine import BUFFER_BEFORE_AFTER_MIN, BUSY_CATEGORIES, BusyIndex, _minutes, add_busy
+
+DEFAULT_DAY_START = "08:00"
+DEFAULT_DAY_END = "23:00"
+
+
+# ---------- Free slots ----------
+# 提案と同じ予定の索引（種別・終日・前後バッファ）から空き時間を出す。
+# テンプレのシフトが提案候補になるのは、そのシフトがどれかの空き枠に収まる時だけ
+def _hm(m: int) -> str:
+    return f"{m // 60:02d}:{m % 60:02d}"
+
+
+def free_windows(index: BusyIndex, ds: str, day_start: int, day_end: int,
+                 buffer_min: int = BUFFER_BEFORE_AFTER_MIN) -> list[tuple[int, int]]:
+    # [day_start, day_end] から、予定の前後バッファ込みの時間を除いた区間
+    out = []
+    cur = day_start
+    for s, e in index.get(ds, ()):
+        bs, be = s - buffer_min, e + buffer_min
+        if be <= cur:
+            continue
+        if bs >= day_end:
+            break
+        if bs > cur:
+            out.append((cur, bs))
+        cur = max(cur, be)
+    if cur < day_end:
+        out.append((cur, day_end))
+    return out
+
+
+def find_free_slots_in_index(index: BusyIndex, start: date, end: date, min_minutes: int = 60,
+                             day_start: str = DEFAULT_DAY_START, day_end: str = DEFAULT_DAY_END,
+                             buffer_min: int = BUFFER_BEFORE_AFTER_MIN) -> list[dict]:
+    ds_min, de_min = _minutes(day_start), _minutes(day_end)
+    slots = []
+    d = start
+    while d <= end:
+        ds = d.strftime("%Y-%m-%d")
+        for s, e in free_windows(index, ds, ds_min, de_min, buffer_min):
+            if e - s >= min_minutes:
+                slots.append({"date": ds, "start": _hm(s), "end": _hm(e), "minutes": e - s})
+        d += timedelta(days=1)
+    return slots
+
+
+def find_free_slots(start: date, end: date, min_minutes: int = 60,
+                    day_start: str = DEFAULT_DAY_START, day_end: str = DEFAULT_DAY_END,
+                    user_id: str = DEFAULT_USER) -> list[dict]:
+    # start〜end（両端含む）で min_minutes 以上空いている時間帯
+    # 長い期間でも行をためずに、読んだそばから索引に入れる
+    index: BusyIndex = {}
+    for rows in iter_events_between(start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), user_id):
+        for _, ev_date, s, e, category, _, _ in rows:
+            if category in BUSY_CATEGORIES:
+                add_busy(index, ev_date, s, e)
+    return find_free_slots_in_index(index, start, end, min_minutes, day_start, day_end)
+
+
+def slot_dates(slots: list[dict]) -> set[str]:
+    # 空き枠のある日。提案の allowed_dates にそのまま渡せる
+    return {s["date"] for s in slots}
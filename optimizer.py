@@ -0,0 +1,209 @@
+from __future__ import annotations
+import math
+import random
+from datetime import date
+from time import perf_counter
+
+from engine import (
+    DAY_HOURS_PENALTY, WORKDAY_PENALTY, BusyIndex, _t, build_week_candidates, busy_day_penalty, busy_events,
+    propose_week_fixed_slots, shifts_conflict,
+)
+
+DEFAULT_BUDGET_MS = 200
+START_TEMPERATURE = 400.0
+END_TEMPERATURE = 2.0
+
+
+# ---------- Objective ----------
+# 貪欲法のスコアを計画全体の値にしたもの：
+#   収入 − 予定のある日のペナルティ − 働く日ごとのWORKDAY_PENALTY
+#   − 同じ日の後ろのシフトほど前のシフトの時間×DAY_HOURS_PENALTY
+# 日ごとの値の合計なので、1手で変わるのは最大2日分だけ（差分で評価できる）
+def _day_value(idxs: list[int], hours: list[int], value: list[int]) -> int:
+    if not idxs:
+        return 0
+    total = -WORKDAY_PENALTY
+    acc = 0
+    for i in idxs:
+        total += value[i] - acc * DAY_HOURS_PENALTY
+        acc += hours[i]
+    return total
+
+
+def plan_score(plan: list[dict], events: list[dict]) -> int:
+    busy_days = {e["date"] for e in busy_events(events) if e.get("date")}
+    by_day: dict[str, list[dict]] = {}
+    for p in sorted(plan, key=lambda x: (x["date"], x["start"])):
+        by_day.setdefault(p["date"], []).append(p)
+    total = 0
+    for ps in by_day.values():
+        total += _day_value(
+            list(range(len(ps))),
+            [p["hours"] for p in ps],
+            [p["income"] - busy_day_penalty(p, busy_days) for p in ps],
+        )
+    return total
+
+
+# ---------- Local search ----------
+def propose_week_local_search(
+    week_start_date: date,
+    max_day: int,
+    max_week: int,
+    wages: dict[str, int],
+    events: list[dict],
+    seed: int = 0,
+    avail_days: dict[str, list[bool]] | None = None,
+    allowed_dates: set[str] | None = None,
+    week_hours_used: int = 0,
+    budget_ms: int = DEFAULT_BUDGET_MS,
+    stats: dict | None = None,
+    busy_index: BusyIndex | None = None,
+):
+    # 貪欲法の結果から焼きなまし（追加・削除・入れ替え）で改善し、
+    # 時間内に見つかった一番良い計画を返す。制約は貪欲法と同じ
+    t0 = perf_counter()
+    deadline = t0 + budget_ms / 1000
+    rnd = random.Random(seed)
+
+    busy_days = {e["date"] for e in busy_events(events) if e.get("date")}
+    cands = build_week_candidates(week_start_date, wages, events, avail_days, allowed_dates,
+                                  busy_index)
+    cands.sort(key=lambda c: (c["date"], c["start"], c["end"], c["workplace"]))
+    n = len(cands)
+    greedy = propose_week_fixed_slots(
+        week_start_date, max_day, max_week, wages, events, seed=seed, avail_days=avail_days,
+        allowed_dates=allowed_dates, week_hours_used=week_hours_used, busy_index=busy_index,
+    )
+    if n == 0:
+        return greedy
+
+    # 候補ごとの値を配列にしておく（ループ内で辞書を引かない）
+    day_keys = sorted({c["date"] for c in cands})
+    day_of = [day_keys.index(c["date"]) for c in cands]
+    hours = [c["hours"] for c in cands]
+    value = [c["income"] - busy_day_penalty(c, busy_days) for c in cands]
+    start_min = [_t(c["start"]).hour * 60 + _t(c["start"]).minute for c in cands]
+    conflict = [0] * n
+    for i in range(n):
+        for j in range(n):
+            if i != j and day_of[i] == day_of[j] and shifts_conflict(cands[i], cands[j]):
+                conflict[i] |= 1 << j
+
+    n_days = len(day_keys)
+    day_picks: list[list[int]] = [[] for _ in range(n_days)]
+    day_mask = [0] * n_days
+    day_hours = [0] * n_days
+    day_val = [0] * n_days
+    picked_list: list[int] = []
+    pos: dict[int, int] = {}
+
+    index_of = {(c["date"], c["start"], c["end"], c["workplace"]): i for i, c in enumerate(cands)}
+    for p in greedy:
+        i = index_of[(p["date"], p["start"], p["end"], p["workplace"])]
+        d = day_of[i]
+        day_picks[d].append(i)
+        day_mask[d] |= 1 << i
+        day_hours[d] += hours[i]
+        pos[i] = len(picked_list)
+        picked_list.append(i)
+    for d in range(n_days):
+        day_picks[d].sort(key=start_min.__getitem__)
+        day_val[d] = _day_value(day_picks[d], hours, value)
+    total_hours = week_hours_used + sum(day_hours)
+    score = sum(day_val)
+    best_score = score
+    best = list(picked_list)
+
+    def with_added(idxs, i):
+        out = list(idxs)
+        k = 0
+        while k < len(out) and start_min[out[k]] <= start_min[i]:
+            k += 1
+        out.insert(k, i)
+        return out
+
+    iters = accepted = 0
+    temp = START_TEMPERATURE
+    while True:
+        iters += 1
+        if iters & 255 == 0:
+            now = perf_counter()
+            if now >= deadline:
+                break
+            frac = (now - t0) / (deadline - t0)
+            temp = START_TEMPERATURE * (END_TEMPERATURE / START_TEMPERATURE) ** frac
+
+        # 手を選ぶ：add(i) / remove(j) / swap(j→i)
+        r = rnd.random()
+        add_i = rem_j = -1
+        if r < 0.4 or not picked_list:
+            add_i = rnd.randrange(n)
+            if add_i in pos:
+                continue
+        elif r < 0.6:
+            rem_j = picked_list[rnd.randrange(len(picked_list))]
+        else:
+            add_i = rnd.randrange(n)
+            if add_i in pos:
+                continue
+            rem_j = picked_list[rnd.randrange(len(picked_list))]
+
+        dh = (hours[add_i] if add_i >= 0 else 0) - (hours[rem_j] if rem_j >= 0 else 0)
+        if total_hours + dh > max_week:
+            continue
+
+        new_vals: dict[int, tuple[list[int], int]] = {}
+        if rem_j >= 0:
+            dj = day_of[rem_j]
+            new_vals[dj] = ([x for x in day_picks[dj] if x != rem_j], day_mask[dj] & ~(1 << rem_j))
+        if add_i >= 0:
+            di = day_of[add_i]
+            idxs, mask = new_vals.get(di, (day_picks[di], day_mask[di]))
+            if conflict[add_i] & mask:
+                continue
+            if sum(hours[x] for x in idxs) + hours[add_i] > max_day:
+                continue
+            new_vals[di] = (with_added(idxs, add_i), mask | (1 << add_i))
+
+        delta = 0
+        for d, (idxs, _) in new_vals.items():
+            delta += _day_value(idxs, hours, value) - day_val[d]
+        if delta < 0 and rnd.random() >= math.exp(delta / temp):
+            continue
+
+        # 採用
+        accepted += 1
+        for d, (idxs, mask) in new_vals.items():
+            day_picks[d] = idxs
+            day_mask[d] = mask
+            day_val[d] = _day_value(idxs, hours, value)
+            day_hours[d] = sum(hours[x] for x in idxs)
+        if rem_j >= 0:
+            k = pos.pop(rem_j)
+            last = picked_list.pop()
+            if last != rem_j:
+                picked_list[k] = last
+                pos[last] = k
+        if add_i >= 0:
+            pos[add_i] = len(picked_list)
+            picked_list.append(add_i)
+        total_hours += dh
+        score += delta
+        if score > best_score:
+            best_score = score
+            best = list(picked_list)
+
+    if stats is not None:
+        elapsed = perf_counter() - t0
+        stats.update({
+            "iterations": iters,
+            "accepted": accepted,
+            "moves_per_sec": iters / elapsed if elapsed > 0 else 0.0,
+            "greedy_score": plan_score(greedy, events),
+            "best_score": best_score,
+        })
+
+    plan = [cands[i] for i in best]
+    plan.sort(key=lambda x: (x["date"], x["start"]))
+    return plan
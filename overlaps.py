@@ -0,0 +1,81 @@
+from __future__ import annotations
+import calendar
+import threading
+from bisect import bisect_left
+
+import db
+from db import DEFAULT_USER, fetch_events_between, get_data_version
+from engine import DAY_MINUTES, _minutes
+
+# 手入力の予定とぶつかったら知らせる種別
+SHIFT_CATEGORIES = ("work", "proposal")
+
+# 日付 → (開始分, 終了分, 予定) を開始順に並べたもの
+ShiftIndex = dict[str, list[tuple[int, int, dict]]]
+
+_month_cache: dict[tuple[str, str, str], tuple[int, ShiftIndex]] = {}
+_lock = threading.Lock()
+
+
+# ---------- Overlap index ----------
+# 勤務・提案の時間帯を月ごとに索引にしておき、ダイアログの確定時に引く。
+# データ版が変わった月だけ作り直す（足りない月はまとめて1回で読む）
+def _span(start: str | None, end: str | None) -> tuple[int, int]:
+    if start is None or end is None:
+        return 0, DAY_MINUTES
+    return _minutes(start), _minutes(end)
+
+
+def build_shift_index(events: list[dict]) -> dict[str, ShiftIndex]:
+    # 月（YYYY-MM）ごとの索引
+    by_month: dict[str, ShiftIndex] = {}
+    for ev in events:
+        if ev["category"] not in SHIFT_CATEGORIES:
+            continue
+        s, e = _span(ev["start"], ev["end"])
+        by_month.setdefault(ev["date"][:7], {}).setdefault(ev["date"], []).append((s, e, ev))
+    for index in by_month.values():
+        for day in index.values():
+            day.sort(key=lambda x: (x[0], x[1]))
+    return by_month
+
+
+def month_indices(months: list[str], user_id: str = DEFAULT_USER) -> dict[str, ShiftIndex]:
+    version = get_data_version(user_id)
+    with _lock:
+        out = {}
+        missing = []
+        for ym in months:
+            hit = _month_cache.get((db.DB_PATH, user_id, ym))
+            if hit is not None and hit[0] == version:
+                out[ym] = hit[1]
+            else:
+                missing.append(ym)
+        if missing:
+            y, m = map(int, missing[-1].split("-"))
+            last = f"{missing[-1]}-{calendar.monthrange(y, m)[1]:02d}"
+            built = build_shift_index(fetch_events_between(f"{missing[0]}-01", last, user_id))
+            for ym in missing:
+                out[ym] = built.get(ym, {})
+                _month_cache[(db.DB_PATH, user_id, ym)] = (version, out[ym])
+        return out
+
+
+def find_conflicts(rows: list[tuple[str, str | None, str | None]], user_id: str = DEFAULT_USER,
+                   exclude_id: int | None = None) -> dict[str, list[dict]]:
+    # rows: (日付, 開始, 終了)。重なる勤務・提案を日付ごとに返す（終日はその日全体）
+    if not rows:
+        return {}
+    index = month_indices(sorted({r[0][:7] for r in rows}), user_id)
+    conflicts: dict[str, list[dict]] = {}
+    for ds, start, end in rows:
+        day = index[ds[:7]].get(ds)
+        if not day:
+            continue
+        s, e = _span(start, end)
+        k = bisect_left(day, (e,))
+        seen = {ev["id"] for ev in conflicts.get(ds, ())}
+        hits = [ev for bs, be, ev in day[:k] if s < be and ev["id"] != exclude_id and ev["id"] not in seen]
+        if hits:
+            conflicts.setdefault(ds, []).extend(hits)
+    return conflicts
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from time import perf_counter
+
+import streamlit as st
+
+from analytics import monthly_totals, load_snapshot, weekday_heatmap, workplace_rates, yearly_totals
+from app_common import init_db_once, user_selector
+from db import get_wages
+
+DOW_LABELS = ["月", "火", "水", "木", "金", "土", "日"]
+
+
+# ---------- main ----------
+st.set_page_config(page_title="分析", layout="wide")
+init_db_once()
+
+st.title("📈 分析（全期間）")
+
+user_id = user_selector()
+
+category = st.radio("対象", ["確定（work）", "提案（proposal）"], horizontal=True, key="an_category")
+category = "work" if category.startswith("確定") else "proposal"
+
+t0 = perf_counter()
+snap = load_snapshot(user_id)
+wages = get_wages(user_id)
+monthly = monthly_totals(snap, wages, category)
+t_ms = (perf_counter() - t0) * 1000
+
+if not monthly:
+    st.info("まだシフトがありません。")
+    st.stop()
+
+import pandas as pd  # noqa: E402  グラフ・表を出す時だけ
+
+st.caption(f"{len(snap['id']):,}件のシフト / 集計 {t_ms:.0f} ms（時給は今の設定で計算）")
+
+# --- 年別 ---
+yearly = yearly_totals(snap, wages, category)
+cols = st.columns(min(len(yearly), 4))
+for c, y in zip(cols, yearly[-4:]):
+    c.metric(f"{y['year']}年", f"{y['income']:,} 円", f"{y['hours']:.0f} h / {y['shifts']}件",
+             delta_color="off")
+
+# --- 月別 ---
+st.subheader("月別の推移")
+df_m = pd.DataFrame(monthly).set_index("ym")
+st.bar_chart(df_m["income"].rename("収入（円）"))
+st.line_chart(df_m["hours"].rename("時間"))
+
+# --- 店別 ---
+st.subheader("店別")
+st.dataframe(
+    pd.DataFrame(workplace_rates(snap, wages, category)).rename(columns={
+        "workplace": "店", "shifts": "件数", "hours": "時間", "income": "収入",
+        "hours_per_shift": "1回あたり時間", "yen_per_hour": "円/時",
+    }),
+    use_container_width=True, hide_index=True,
+)
+
+# --- 曜日×時刻 ---
+st.subheader("曜日 × 時刻（合計時間）")
+heat = weekday_heatmap(snap, category)
+df_h = pd.DataFrame(
+    [(DOW_LABELS[d], h, heat[d, h]) for d in range(7) for h in range(24) if heat[:, h].any()],
+    columns=["曜日", "時", "時間"],
+)
+st.vega_lite_chart(df_h, {
+    "mark": "rect",
+    "encoding": {
+        "x": {"field": "時", "type": "ordinal"},
+        "y": {"field": "曜日", "type": "ordinal", "sort": DOW_LABELS},
+        "color": {"field": "時間", "type": "quantitative", "scale": {"scheme": "blues"}},
+        "tooltip": [{"field": "曜日"}, {"field": "時"}, {"field": "時間", "format": ".1f"}],
+    },
+}, use_container_width=True)
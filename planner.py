@@ -0,0 +1,138 @@
+from __future__ import annotations
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+
+from db import (
+    DEFAULT_USER, fetch_changes_since, fetch_events_between, get_data_version,
+    get_proposal_run, get_settings, get_wages, reconcile_proposals, set_proposal_run,
+)
+from engine import iter_week_starts_in_month, month_horizon, month_range, monday_of
+from engine_api import (
+    ENGINE_GREEDY, ENGINE_LOCAL_SEARCH, NEIGHBOUR_HOURS_CATEGORIES, plan_month,
+)
+from optimizer import DEFAULT_BUDGET_MS
+
+# 提案の入力になる種別（proposal自体の変更は出力なので見ない）
+PROPOSAL_INPUT_CATEGORIES = ("class", "job", "private", "work")
+
+
+# ---------- Month proposal ----------
+def _propose_weeks(year: int, month: int, seed: int, events: list[dict],
+                   avail_days: dict[str, list[bool]] | None, user_id: str,
+                   week_indices: set[int] | None = None,
+                   engine: str = ENGINE_GREEDY, budget_ms: int = DEFAULT_BUDGET_MS) -> list[dict]:
+    # 設定と時給をDBから読んで engine_api.plan_month に渡す
+    max_day, max_week = get_settings(user_id)
+    return plan_month(year, month, seed, events, get_wages(user_id), max_day, max_week,
+                      avail_days, week_indices, engine, budget_ms)
+
+
+def horizon_snapshot(year: int, month: int, user_id: str,
+                      replaced: list[tuple[str, str]]) -> list[dict]:
+    # 月にかかる週全体の予定を1回で読む。作り直す範囲の提案だけ外す
+    h_start, h_end = month_horizon(year, month)
+    return [
+        e for e in fetch_events_between(h_start.strftime("%Y-%m-%d"), h_end.strftime("%Y-%m-%d"), user_id)
+        if not (e["category"] == "proposal" and any(s <= e["date"] <= t for s, t in replaced))
+    ]
+
+
+def proposal_params(avail_days: dict[str, list[bool]] | None, user_id: str, engine: str) -> str:
+    # 予定以外で提案の結果を変える入力（上限・時給・曜日・エンジン）の指紋
+    max_day, max_week = get_settings(user_id)
+    key = {"max_day": max_day, "max_week": max_week, "wages": get_wages(user_id),
+           "avail_days": avail_days, "engine": engine}
+    return hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+def generate_month_proposals(year: int, month: int, seed: int,
+                             avail_days: dict[str, list[bool]] | None = None,
+                             user_id: str = DEFAULT_USER,
+                             engine: str = ENGINE_GREEDY,
+                             budget_ms: int = DEFAULT_BUDGET_MS) -> list[dict]:
+    # 月全体を作り直す（DBへは既存の提案との差分だけ書く）
+    first, last = month_range(year, month)
+    start_s = first.strftime("%Y-%m-%d")
+    end_s = last.strftime("%Y-%m-%d")
+
+    events = horizon_snapshot(year, month, user_id, [(start_s, end_s)])
+    picks = _propose_weeks(year, month, seed, events, avail_days, user_id,
+                           engine=engine, budget_ms=budget_ms)
+    reconcile_proposals([(start_s, end_s)], picks, user_id)
+    set_proposal_run(f"{year}-{month:02d}", get_data_version(user_id), seed,
+                     proposal_params(avail_days, user_id, engine), user_id)
+    return picks
+
+
+def dirty_week_indices(year: int, month: int, user_id: str = DEFAULT_USER,
+                       params: str | None = None) -> set[int] | None:
+    # 前回の提案以降に入力側の予定が変わった週。提案がまだ無ければNone。
+    # params（proposal_params）が前回と違えば全部の週
+    run = get_proposal_run(f"{year}-{month:02d}", user_id)
+    if run is None:
+        return None
+    version, _, run_params = run
+    if params is not None and params != run_params:
+        return set(range(len(iter_week_starts_in_month(year, month))))
+    first, last = month_range(year, month)
+    h_start, h_end = month_horizon(year, month)
+    # 候補・バッファ・移動時間の判定はどれも同じ日の予定としか比べないので、
+    # 変更の影響はその日を含む週（週上限を通じて週全体）に閉じる。
+    # 隣の月の日は週上限に数える勤務・提案の変更だけ見る
+    week_index = {ws: wi for wi, ws in enumerate(iter_week_starts_in_month(year, month))}
+    dirty = set()
+    for c in fetch_changes_since(version, user_id):
+        try:
+            d = datetime.strptime(c["date"], "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        if not (h_start <= d <= h_end):
+            continue
+        in_month = first <= d <= last
+        if (in_month and c["category"] in PROPOSAL_INPUT_CATEGORIES) or (
+            not in_month and c["category"] in NEIGHBOUR_HOURS_CATEGORIES
+        ):
+            dirty.add(week_index[monday_of(d)])
+    return dirty
+
+
+def regenerate_changed_weeks(year: int, month: int,
+                             avail_days: dict[str, list[bool]] | None = None,
+                             user_id: str = DEFAULT_USER,
+                             engine: str = ENGINE_GREEDY,
+                             budget_ms: int = DEFAULT_BUDGET_MS) -> tuple[list[date], list[dict]] | None:
+    # 変わった週だけ前回と同じseedで作り直す。(作り直した週, 新しい提案) を返す。
+    # 上限・時給・曜日・エンジンが前回と違えば全部の週を作り直す
+    ym = f"{year}-{month:02d}"
+    params = proposal_params(avail_days, user_id, engine)
+    run = get_proposal_run(ym, user_id)
+    dirty = dirty_week_indices(year, month, user_id, params)
+    if run is None or dirty is None:
+        return None
+    seed = run[1]
+
+    first, last = month_range(year, month)
+    week_starts = iter_week_starts_in_month(year, month)
+    picks: list[dict] = []
+    if dirty:
+        ranges = [
+            (max(week_starts[wi], first).strftime("%Y-%m-%d"),
+             min(week_starts[wi] + timedelta(days=6), last).strftime("%Y-%m-%d"))
+            for wi in sorted(dirty)
+        ]
+        # 作り直す週の提案だけ入力から外す。他の週の提案は別の日なので結果に影響しない
+        events = horizon_snapshot(year, month, user_id, ranges)
+        picks = _propose_weeks(year, month, seed, events, avail_days, user_id, dirty,
+                               engine=engine, budget_ms=budget_ms)
+        reconcile_proposals(ranges, picks, user_id)
+    set_proposal_run(ym, get_data_version(user_id), seed, params, user_id)
+    return [week_starts[wi] for wi in sorted(dirty)], picks
+
+
+def mark_proposals_current(year: int, month: int, user_id: str = DEFAULT_USER):
+    # 確定などで入力側が変わっても、今の提案を最新扱いにする
+    ym = f"{year}-{month:02d}"
+    run = get_proposal_run(ym, user_id)
+    if run is not None:
+        set_proposal_run(ym, get_data_version(user_id), run[1], run[2], user_id)
@@ -1,513 +1,51 @@
 from __future__ import annotations
-import pandas as pd
-import sqlite3
-import calendar
+from time import perf_counter
+
+_T0 = perf_counter()
+
 import re
-from dataclasses import dataclass
-from datetime import date, datetime, time, timedelta
-from typing import Optional
+from datetime import date, datetime, timedelta
 import streamlit as st
-from streamlit_calendar import calendar as st_calendar
+from db import (
+    add_events, delete_event, update_event,
+    fetch_events_in_month, fetch_event_by_id,
+    upsert_settings, get_settings, upsert_wage, get_wages,
+    delete_proposals_in_range, convert_proposals_to_work,
+    archive_old_months, get_month_summaries, get_archive_horizon, set_archive_horizon,
+    get_data_version, is_month_archived,
+)
+from app_common import current_user, init_db_once, user_selector
+from calendar_payload import build_fc_events, format_event_label, payload_hash
+from engine import BUFFER_BEFORE_AFTER_MIN, _t, month_range
+from exports import events_csv_file
+from freeslots import DEFAULT_DAY_END, DEFAULT_DAY_START, find_free_slots
+from overlaps import find_conflicts
+from planner import (
+    ENGINE_GREEDY, ENGINE_LOCAL_SEARCH,
+    generate_month_proposals, regenerate_changed_weeks, mark_proposals_current,
+)
+from whatif import build_scenarios, evaluate_scenarios
 
-DB_PATH = "app.db"
+_T_IMPORTS = perf_counter()
 
-SHIFT_TEMPLATES = {
-    "成城石井": [("10:00", "14:00"), ("17:00", "22:00"), ("18:00", "22:00")],
-    "サンマルク": [
-        ("10:00", "16:00"), ("11:00", "17:00"), ("12:00", "18:00"),
-        ("13:00", "19:00"), ("14:00", "20:00"), ("16:00", "22:00"),
-        ("14:00", "18:00"), ("17:00", "22:00"), ("18:00", "22:00"),
-    ],
+CAT_LABELS = ["class（授業）", "job（就活）", "private（遊び）", "work（確定バイト）", "proposal（提案シフト）"]
+CAT_MAP = {
+    "class（授業）": "class",
+    "job（就活）": "job",
+    "private（遊び）": "private",
+    "work（確定バイト）": "work",
+    "proposal（提案シフト）": "proposal",
 }
-BUFFER_BEFORE_AFTER_MIN = 60
-TRAVEL_BETWEEN_WORKPLACES_MIN = 60
-WORKDAY_PENALTY = 250
-
-
-# ---------- DB ----------
-def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
-
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS events (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ev_date TEXT NOT NULL,          -- YYYY-MM-DD
-        start_time TEXT,                -- HH:MM (nullable, 終日はNULLでもOK)
-        end_time TEXT,                  -- HH:MM
-        category TEXT NOT NULL,          -- class / job / private / work / proposal
-        title TEXT NOT NULL,
-        place TEXT                       -- store名など（任意）
-    );
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS availability (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        workplace TEXT NOT NULL,         -- サンマルク / 成城石井
-        day_type TEXT NOT NULL,          -- weekday / weekend / dow
-        dow INTEGER,                     -- 0=Mon..6=Sun（day_type='dow'の時だけ）
-        start_time TEXT NOT NULL,        -- HH:MM
-        end_time TEXT NOT NULL           -- HH:MM
-    );
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS settings (
-        id INTEGER PRIMARY KEY CHECK (id = 1),
-        max_hours_per_day INTEGER,
-        max_hours_per_week INTEGER
-    );
-    """)
-    cur.execute("""
-    INSERT OR IGNORE INTO settings (id, max_hours_per_day, max_hours_per_week)
-    VALUES (1, 6, 20);
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS wages (
-        workplace TEXT PRIMARY KEY,
-        hourly_wage INTEGER NOT NULL
-    );
-    """)
-
-    conn.commit()
-    conn.close()
-
-
-def add_event(ev_date: str, start_time: Optional[str], end_time: Optional[str],
-             category: str, title: str, place: Optional[str] = None):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO events (ev_date, start_time, end_time, category, title, place)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (ev_date, start_time, end_time, category, title, place),
-    )
-    conn.commit()
-    conn.close()
-
-
-def delete_event(event_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM events WHERE id = ?", (event_id,))
-    conn.commit()
-    conn.close()
-
-def update_event(event_id: int, ev_date: str, start_time: Optional[str], end_time: Optional[str],
-                 category: str, title: str, place: Optional[str] = None):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        UPDATE events
-        SET ev_date=?, start_time=?, end_time=?, category=?, title=?, place=?
-        WHERE id=?
-        """,
-        (ev_date, start_time, end_time, category, title, place, event_id),
-    )
-    conn.commit()
-    conn.close()
-
-
-def fetch_events_in_month(year: int, month: int):
-    start = f"{year}-{month:02d}-01"
-    last_day = calendar.monthrange(year, month)[1]
-    end = f"{year}-{month:02d}-{last_day:02d}"
-
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, ev_date, start_time, end_time, category, title, place
-        FROM events
-        WHERE ev_date BETWEEN ? AND ?
-        ORDER BY ev_date ASC, start_time ASC
-        """,
-        (start, end),
-    )
-    rows = cur.fetchall()
-    conn.close()
-
-    by_date = {}
-    for r in rows:
-        ev = {
-            "id": r[0],
-            "date": r[1],
-            "start": r[2],
-            "end": r[3],
-            "category": r[4],
-            "title": r[5],
-            "place": r[6],
-        }
-        by_date.setdefault(ev["date"], []).append(ev)
-    return by_date
-
-
-def fetch_events_between(start_date: str, end_date: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, ev_date, start_time, end_time, category, title, place
-        FROM events
-        WHERE ev_date BETWEEN ? AND ?
-        ORDER BY ev_date ASC, start_time ASC
-        """,
-        (start_date, end_date),
-    )
-    rows = cur.fetchall()
-    conn.close()
-
-    return [
-        {
-            "id": r[0],
-            "date": r[1],
-            "start": r[2],
-            "end": r[3],
-            "category": r[4],
-            "title": r[5],
-            "place": r[6],
-        }
-        for r in rows
-    ]
-
-def fetch_event_by_id(event_id: int) -> Optional[dict]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, ev_date, start_time, end_time, category, title, place
-        FROM events
-        WHERE id = ?
-        """,
-        (event_id,),
-    )
-    r = cur.fetchone()
-    conn.close()
-    if not r:
-        return None
-    return {
-        "id": r[0],
-        "date": r[1],
-        "start": r[2],
-        "end": r[3],
-        "category": r[4],
-        "title": r[5],
-        "place": r[6],
-    }
-
-# ---------- DB (proposal config) ----------
-def upsert_settings(max_day: int, max_week: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE settings SET max_hours_per_day=?, max_hours_per_week=? WHERE id=1",
-        (max_day, max_week),
-    )
-    conn.commit()
-    conn.close()
-
-
-def get_settings() -> tuple[int, int]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT max_hours_per_day, max_hours_per_week FROM settings WHERE id=1")
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return 6, 20
-    return int(row[0] or 6), int(row[1] or 20)
-
-
-def upsert_wage(workplace: str, hourly_wage: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO wages(workplace, hourly_wage) VALUES(?, ?) "
-        "ON CONFLICT(workplace) DO UPDATE SET hourly_wage=excluded.hourly_wage",
-        (workplace, hourly_wage),
-    )
-    conn.commit()
-    conn.close()
-
-
-def get_wages() -> dict[str, int]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT workplace, hourly_wage FROM wages")
-    rows = cur.fetchall()
-    conn.close()
-    return {r[0]: int(r[1]) for r in rows}
-
-
-def add_availability(workplace: str, day_type: str, dow: Optional[int], start_time: str, end_time: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO availability(workplace, day_type, dow, start_time, end_time)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (workplace, day_type, dow, start_time, end_time),
-    )
-    conn.commit()
-    conn.close()
-
-
-def delete_availability(avail_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM availability WHERE id=?", (avail_id,))
-    conn.commit()
-    conn.close()
-
-
-def get_availabilities() -> list[dict]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, workplace, day_type, dow, start_time, end_time
-        FROM availability
-        ORDER BY workplace, day_type, dow, start_time
-        """
-    )
-    rows = cur.fetchall()
-    conn.close()
-    return [
-        {
-            "id": r[0],
-            "workplace": r[1],
-            "day_type": r[2],
-            "dow": r[3],
-            "start_time": r[4],
-            "end_time": r[5],
-        }
-        for r in rows
-    ]
-
-
-def delete_proposals_in_range(start_date: str, end_date: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        DELETE FROM events
-        WHERE category='proposal' AND ev_date BETWEEN ? AND ?
-        """,
-        (start_date, end_date),
-    )
-    conn.commit()
-    conn.close()
-
-
-def convert_proposals_to_work(start_date: str, end_date: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        UPDATE events
-        SET category='work'
-        WHERE category='proposal' AND ev_date BETWEEN ? AND ?
-        """,
-        (start_date, end_date),
-    )
-    conn.commit()
-    conn.close()
-
-
-# ---------- Proposal logic ----------
-def _t(s: str) -> time:
-    return datetime.strptime(s, "%H:%M").time()
-
-def monday_of(d: date) -> date:
-    return d - timedelta(days=d.weekday())
-
-def month_range(year: int, month: int) -> tuple[date, date]:
-    first = date(year, month, 1)
-    last_day = calendar.monthrange(year, month)[1]
-    last = date(year, month, last_day)
-    return first, last
-
-def iter_week_starts_in_month(year: int, month: int) -> list[date]:
-    first, last = month_range(year, month)
-    start = monday_of(first)
-    week_starts = []
-    d = start
-    while d <= last:
-        week_starts.append(d)
-        d += timedelta(days=7)
-    return week_starts
-
-
-def propose_week_fixed_slots(
-    week_start_date: date,
-    max_day: int,
-    max_week: int,
-    wages: dict[str, int],
-    events: list[dict],
-    seed: int = 0,
-    avail_days: dict[str, list[bool]] | None = None,
-):
-    import random
-    rnd = random.Random(seed)
-
-    busy = [e for e in events if e["category"] in ("class", "job", "private", "work", "proposal")]
-    busy_days = {e["date"] for e in busy if e.get("date")}
-
-    def to_dt(d: date, hm: str) -> datetime:
-        return datetime.combine(d, _t(hm))
-
-    def overlaps(a_s: datetime, a_e: datetime, b_s: datetime, b_e: datetime) -> bool:
-        return (a_s < b_e) and (b_s < a_e)
-
-    def is_busy_with_buffer(d: date, s: str, e: str) -> bool:
-        ss = to_dt(d, s) - timedelta(minutes=BUFFER_BEFORE_AFTER_MIN)
-        ee = to_dt(d, e) + timedelta(minutes=BUFFER_BEFORE_AFTER_MIN)
-        ds = d.strftime("%Y-%m-%d")
-
-        for b in busy:
-            if b["date"] != ds:
-                continue
-            if b["start"] is None or b["end"] is None:
-                return True
-            bs = to_dt(d, b["start"])
-            be = to_dt(d, b["end"])
-            if overlaps(ss, ee, bs, be):
-                return True
-        return False
-
-
-    def conflicts_with_picked(d: date, s: str, e: str, workplace: str, picked: list[dict]) -> bool:
-        ss = to_dt(d, s)
-        ee = to_dt(d, e)
-        for p in picked:
-            if p["date"] != d.strftime("%Y-%m-%d"):
-                continue
-            ps = to_dt(d, p["start"])
-            pe = to_dt(d, p["end"])
-
-            if p["workplace"] == workplace:
-                if overlaps(ss, ee, ps, pe):
-                    return True
-            else:
-                gap1 = (ss - pe).total_seconds() / 60  
-                gap2 = (ps - ee).total_seconds() / 60  
-                if not (gap1 >= TRAVEL_BETWEEN_WORKPLACES_MIN or gap2 >= TRAVEL_BETWEEN_WORKPLACES_MIN):
-                    return True
-        return False
-
-    # ---- 候補生成（固定枠＋曜日ON/OFF）----
-    candidates = []
-    for i in range(7):
-        d = week_start_date + timedelta(days=i)
-        dow = d.weekday()
-        ds = d.strftime("%Y-%m-%d")
-
-        for w, shifts in SHIFT_TEMPLATES.items():
-            # 曜日ON/OFF
-            if avail_days is not None and not avail_days.get(w, [True] * 7)[dow]:
-                continue
-
-            wage = wages.get(w, 0)
-
-            for (s, e) in shifts:
-                if w == "サンマルク" and dow == 1 and e == "22:00":
-                    continue
-
-                if is_busy_with_buffer(d, s, e):
-                    continue
-
-                hours = int((to_dt(d, e) - to_dt(d, s)).total_seconds() // 3600)
-                candidates.append({
-                    "date": ds,
-                    "start": s,
-                    "end": e,
-                    "workplace": w,
-                    "hours": hours,
-                    "income": hours * wage,
-                })
-
-    # ---- 選択（稼ぎ最大＋働く日の増加を少し抑える）----
-    picked = []
-    day_hours: dict[str, int] = {}
-    workdays = set()
-    total_hours = 0
-
-    BUSY_DAY_PENALTY = 3000
-    BUSY_DAY_PENALTY_STM = 7000  
-
-    def score(c):
-        sc = c["income"]
-
-        if c["date"] in busy_days:
-            if c["workplace"] == "サンマルク":
-                sc -= BUSY_DAY_PENALTY_STM
-            else:
-                sc -= BUSY_DAY_PENALTY
-
-        if c["date"] not in workdays:
-            sc -= WORKDAY_PENALTY
-
-        sc -= day_hours.get(c["date"], 0) * 50
-        sc += rnd.randint(0, 30)
-        return sc
-
-
-    while True:
-        best = None
-        best_sc = -10**18
-
-        for c in candidates:
-            if total_hours + c["hours"] > max_week:
-                continue
-            if day_hours.get(c["date"], 0) + c["hours"] > max_day:
-                continue
-
-            d_obj = datetime.strptime(c["date"], "%Y-%m-%d").date()
-            if conflicts_with_picked(d_obj, c["start"], c["end"], c["workplace"], picked):
-                continue
-
-            sc = score(c)
-            if sc > best_sc:
-                best_sc = sc
-                best = c
-
-        if best is None:
-            break
-
-        picked.append(best)
-        total_hours += best["hours"]
-        day_hours[best["date"]] = day_hours.get(best["date"], 0) + best["hours"]
-        workdays.add(best["date"])
-
-        candidates = [x for x in candidates if not (
-            x["date"] == best["date"]
-            and x["start"] == best["start"]
-            and x["end"] == best["end"]
-            and x["workplace"] == best["workplace"]
-        )]
-
-    picked.sort(key=lambda x: (x["date"], x["start"]))
-    return picked
-
+CAT_REV_MAP = {v: k for k, v in CAT_MAP.items()}
 
 
 # ---------- UI helpers ----------
-def format_event_label(ev):
-    prefix = "✅ " if ev["category"] == "work" else ""
-    name = ev["place"] or ev["title"]  # 店名優先
-    if ev["start"] and ev["end"]:
-        return f'{prefix}{ev["start"]}-{ev["end"]} {name}'
-    return f'{prefix}{name}'
+def show_conflicts(conflicts: dict[str, list[dict]]):
+    lines = [
+        f"- {d}：" + "、".join(f"{format_event_label(ev)} [{ev['category']}]" for ev in evs)
+        for d, evs in sorted(conflicts.items())
+    ]
+    st.error(f"{len(conflicts)}日で勤務・提案と重なっています\n" + "\n".join(lines))
 
 
 @st.dialog("予定をまとめて追加（単日 / 連続）")
@@ -541,15 +79,7 @@ def show_bulk_add_dialog():
     # --- 予定内容 ---
     all_day = st.checkbox("終日", value=False)
 
-    cat_labels = ["class（授業）", "job（就活）", "private（遊び）", "work（確定バイト）", "proposal（提案シフト）"]
-    cat_map = {
-        "class（授業）": "class",
-        "job（就活）": "job",
-        "private（遊び）": "private",
-        "work（確定バイト）": "work",
-        "proposal（提案シフト）": "proposal",
-    }
-    category_ui = st.selectbox("種別", cat_labels)
+    category_ui = st.selectbox("種別", CAT_LABELS)
 
     start_time = end_time = None
     if not all_day:
@@ -562,6 +92,8 @@ def show_bulk_add_dialog():
     title = st.text_input("タイトル", placeholder="例：サンマルク")
     place = st.text_input("場所・店名（任意）")
 
+    allow_overlap = st.checkbox("勤務・提案と重なっても追加する", value=False, key="bulk_allow_overlap")
+
     if st.button("まとめて追加", use_container_width=True):
         if not selected_dates:
             st.error("日付を選択してください")
@@ -572,18 +104,27 @@ def show_bulk_add_dialog():
         if (start_time is not None) and (end_time is not None) and start_time >= end_time:
             st.error("開始 < 終了 にしてください")
             return
+        if not allow_overlap:
+            # 期間全体を1回で照合する
+            conflicts = find_conflicts(
+                [(d.strftime("%Y-%m-%d"), start_time, end_time) for d in selected_dates], current_user()
+            )
+            if conflicts:
+                show_conflicts(conflicts)
+                return
 
-        cnt = 0
-        for d in selected_dates:
-            add_event(
+        ids = add_events([
+            (
                 d.strftime("%Y-%m-%d"),
                 start_time,
                 end_time,
-                cat_map[category_ui],
+                CAT_MAP[category_ui],
                 title.strip(),
                 place.strip() or None,
             )
-            cnt += 1
+            for d in selected_dates
+        ], user_id=current_user())
+        cnt = len(ids)
 
         st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
         st.session_state["skip_next_dateclick"] = True
@@ -601,22 +142,13 @@ def show_edit_event_dialog(ev: dict):
     all_day_default = (ev["start"] is None or ev["end"] is None)
     all_day = st.checkbox("終日", value=all_day_default, key=f"edit_all_day_{ev['id']}")
 
-    cat_labels = ["class（授業）", "job（就活）", "private（遊び）", "work（確定バイト）", "proposal（提案シフト）"]
-    cat_map = {
-        "class（授業）": "class",
-        "job（就活）": "job",
-        "private（遊び）": "private",
-        "work（確定バイト）": "work",
-        "proposal（提案シフト）": "proposal",
-    }
-    rev_map = {v: k for k, v in cat_map.items()}
 
     with st.form(f"edit_form_{ev['id']}"):
         new_date = st.date_input("日付", value=datetime.strptime(ev["date"], "%Y-%m-%d").date())
         category_ui = st.selectbox(
             "種別",
-            cat_labels,
-            index=cat_labels.index(rev_map.get(ev["category"], cat_labels[0])),
+            CAT_LABELS,
+            index=CAT_LABELS.index(CAT_REV_MAP.get(ev["category"], CAT_LABELS[0])),
         )
 
         start_time = end_time = None
@@ -631,6 +163,7 @@ def show_edit_event_dialog(ev: dict):
 
         title = st.text_input("タイトル", value=ev["title"], key=f"edit_title_{ev['id']}")
         place = st.text_input("場所・店名", value=ev["place"] or "", key=f"edit_place_{ev['id']}")
+        allow_overlap = st.checkbox("勤務・提案と重なっても保存する", value=False, key=f"edit_overlap_{ev['id']}")
 
         c1, c2, c3 = st.columns([2, 2, 2])
         save = c1.form_submit_button("保存", use_container_width=True)
@@ -638,11 +171,12 @@ def show_edit_event_dialog(ev: dict):
         cancel = c3.form_submit_button("キャンセル", use_container_width=True)
 
         if cancel:
+            st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
             st.session_state["skip_next_dateclick"] = True
             st.rerun()
 
         if delete:
-            delete_event(int(ev["id"]))
+            delete_event(int(ev["id"]), user_id=current_user())
             st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
             st.session_state["skip_next_dateclick"] = True
             st.rerun()
@@ -654,15 +188,24 @@ def show_edit_event_dialog(ev: dict):
             if (start_time is not None) and (end_time is not None) and start_time >= end_time:
                 st.error("開始 < 終了 にしてください")
                 return
+            if not allow_overlap:
+                conflicts = find_conflicts(
+                    [(new_date.strftime("%Y-%m-%d"), start_time, end_time)],
+                    current_user(), exclude_id=int(ev["id"]),
+                )
+                if conflicts:
+                    show_conflicts(conflicts)
+                    return
 
             update_event(
                 int(ev["id"]),
                 new_date.strftime("%Y-%m-%d"),
                 start_time,
                 end_time,
-                cat_map[category_ui],
+                CAT_MAP[category_ui],
                 title.strip(),
                 place.strip() or None,
+                user_id=current_user(),
             )
             st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
             st.session_state["skip_next_dateclick"] = True
@@ -672,10 +215,24 @@ def show_edit_event_dialog(ev: dict):
 
 # ---------- main ----------
 st.set_page_config(page_title="バイトシフト作成", layout="wide")
-init_db()
+timings: list[tuple[str, float]] = [("imports", (_T_IMPORTS - _T0) * 1000)]
+_t_mark = perf_counter()
+
+
+def mark(label: str):
+    global _t_mark
+    now = perf_counter()
+    timings.append((label, (now - _t_mark) * 1000))
+    _t_mark = now
+
+
+init_db_ms = init_db_once()
+mark("init_db")
 
 st.title("📅 バイトシフト作成アプリ")
 
+user_id = user_selector()
+
 today = date.today()
 
 if "year" not in st.session_state:
@@ -703,21 +260,21 @@ st.sidebar.header("🧠 シフト提案")
 
 # 上限
 st.sidebar.subheader("上限設定")
-max_day, max_week = get_settings()
+max_day, max_week = get_settings(user_id)
 new_max_day = st.sidebar.number_input("1日上限（時間）", 0, 24, max_day, 1)
 new_max_week = st.sidebar.number_input("週上限（時間）", 0, 80, max_week, 1)
 if st.sidebar.button("上限を保存", use_container_width=True):
-    upsert_settings(int(new_max_day), int(new_max_week))
+    upsert_settings(int(new_max_day), int(new_max_week), user_id)
     st.sidebar.success("保存しました")
 
 # 時給
 st.sidebar.subheader("時給設定")
-wages = get_wages()
+wages = get_wages(user_id)
 wp = st.sidebar.selectbox("バイト先", ["サンマルク", "成城石井"])
 w0 = wages.get(wp, 1100)
 wage_val = st.sidebar.number_input("時給（円）", 0, 10000, int(w0), 1)
 if st.sidebar.button("時給を保存", use_container_width=True):
-    upsert_wage(wp, int(wage_val))
+    upsert_wage(wp, int(wage_val), user_id)
     st.sidebar.success("保存しました")
 
 # ✅ A案：提案に使う曜日（ON/OFFだけ）
@@ -749,6 +306,10 @@ if "proposal_seed" not in st.session_state:
 
 first, last = month_range(year, month)
 st.sidebar.write(f"対象：{first.strftime('%Y-%m')}（{first}〜{last}）")
+month_archived = is_month_archived(year, month, user_id)
+ARCHIVED_MSG = "アーカイブ済みの月です（提案の作成・確定・削除はできません）"
+if month_archived:
+    st.sidebar.caption("この月はアーカイブ済みです")
 
 cA, cB = st.sidebar.columns(2)
 if cA.button("別案", use_container_width=True):
@@ -756,81 +317,112 @@ if cA.button("別案", use_container_width=True):
 if cB.button("seedリセット", use_container_width=True):
     st.session_state["proposal_seed"] = 0
 
-if st.sidebar.button("今月の提案を作成", use_container_width=True):
-    wages = get_wages()
-    max_day, max_week = get_settings()
+# 提案エンジン（局所探索は貪欲法の結果から時間いっぱい改善する）
+ENGINE_LABELS = {"貪欲法": ENGINE_GREEDY, "局所探索": ENGINE_LOCAL_SEARCH}
+engine_ui = st.sidebar.radio("提案エンジン", list(ENGINE_LABELS), horizontal=True, key="engine")
+engine = ENGINE_LABELS[engine_ui]
+budget_ms = 200
+if engine == ENGINE_LOCAL_SEARCH:
+    budget_ms = st.sidebar.slider("1週あたりの探索時間（ms）", 50, 2000, 200, 50, key="ls_budget_ms")
 
-    if not wages:
+if st.sidebar.button("今月の提案を作成", use_container_width=True):
+    if month_archived:
+        st.sidebar.error(ARCHIVED_MSG)
+    elif not get_wages(user_id):
         st.sidebar.error("時給が未登録です")
     else:
-        start_s = first.strftime("%Y-%m-%d")
-        end_s = last.strftime("%Y-%m-%d")
-
-        delete_proposals_in_range(start_s, end_s)
-        events_month = fetch_events_between(start_s, end_s)
-
-        total_h = 0
-        total_income = 0
-
-        for wi, ws in enumerate(iter_week_starts_in_month(year, month)):
-            picked = propose_week_fixed_slots(
-                week_start_date=ws,
-                max_day=max_day,
-                max_week=max_week,
-                wages=wages,
-                events=events_month,
-                seed=st.session_state["proposal_seed"] + wi * 101,
-                avail_days=st.session_state["avail_days"],
-            )
+        picked = generate_month_proposals(
+            year, month, st.session_state["proposal_seed"], st.session_state["avail_days"], user_id,
+            engine=engine, budget_ms=budget_ms,
+        )
+        total_h = sum(p["hours"] for p in picked)
+        total_income = sum(p["income"] for p in picked)
+        st.sidebar.success(f"作成：{total_h}時間 / {total_income:,}円（seed={st.session_state['proposal_seed']}）")
+        st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
+        st.session_state["skip_next_dateclick"] = True
+        st.rerun()
 
-            for p in picked:
-                pd = datetime.strptime(p["date"], "%Y-%m-%d").date()
-                if pd < first or pd > last:
-                    continue
+# 予定を直した週だけ作り直す（他の週の提案はそのまま）
+if st.sidebar.button("変更のあった週だけ再提案", use_container_width=True):
+    if month_archived:
+        st.sidebar.error(ARCHIVED_MSG)
+    else:
+        result = regenerate_changed_weeks(
+            year, month, st.session_state["avail_days"], user_id, engine=engine, budget_ms=budget_ms
+        )
+        if result is None:
+            st.sidebar.error("先に「今月の提案を作成」を実行してください")
+        elif not result[0]:
+            st.sidebar.info("前回の提案から変更はありません")
+        else:
+            weeks, picked = result
+            st.session_state["flash"] = (
+                f"再提案：{len(weeks)}週（{', '.join(ws.strftime('%m/%d') for ws in weeks)}〜）"
+                f" / {sum(p['hours'] for p in picked)}時間"
+            )
+            st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
+            st.session_state["skip_next_dateclick"] = True
+            st.rerun()
+if st.session_state.get("flash"):
+    st.sidebar.success(st.session_state.pop("flash"))
 
-                add_event(p["date"], p["start"], p["end"], "proposal",  p["workplace"], p["workplace"])
 
-                # proposal同士も衝突扱いにするため追加
-                events_month.append({
-                    "id": -1,
-                    "date": p["date"],
-                    "start": p["start"],
-                    "end": p["end"],
-                    "category": "proposal",
-                    "title":  p["workplace"],
-                    "place": p["workplace"],
-                })
+if st.sidebar.button("今月の提案を確定（workへ）", use_container_width=True):
+    if month_archived:
+        st.sidebar.error(ARCHIVED_MSG)
+    else:
+        convert_proposals_to_work(first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d"), user_id)
+        mark_proposals_current(year, month, user_id)
+        st.sidebar.success("確定しました（proposal→work）")
+        st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
+        st.session_state["skip_next_dateclick"] = True
+        st.rerun()
 
-                total_h += p["hours"]
-                total_income += p["income"]
+st.sidebar.subheader("🗑 提案シフトの管理")
 
-        st.sidebar.success(f"作成：{total_h}時間 / {total_income:,}円（seed={st.session_state['proposal_seed']}）")
+if st.sidebar.button("今月の提案シフトを一括削除", use_container_width=True):
+    if month_archived:
+        st.sidebar.error(ARCHIVED_MSG)
+    else:
+        delete_proposals_in_range(
+            first.strftime("%Y-%m-%d"),
+            last.strftime("%Y-%m-%d"),
+            user_id,
+        )
+        st.sidebar.success("今月の提案シフトをすべて削除しました")
         st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
         st.session_state["skip_next_dateclick"] = True
         st.rerun()
 
+# アーカイブ
+st.sidebar.subheader("🗄 アーカイブ")
+horizon = st.sidebar.number_input("何か月より前をアーカイブ", 1, 120, get_archive_horizon(user_id), 1)
+if st.sidebar.button("古い月をアーカイブ", use_container_width=True):
+    set_archive_horizon(int(horizon), user_id)
+    moved = archive_old_months(int(horizon), user_id=user_id)
+    st.sidebar.success(f"{moved}件をアーカイブしました")
+summaries = get_month_summaries(user_id)
+if summaries:
+    st.sidebar.caption(f"アーカイブ済み：〜{summaries[-1]['ym']}（{len({r['ym'] for r in summaries})}か月）")
 
-if st.sidebar.button("今月の提案を確定（workへ）", use_container_width=True):
-    convert_proposals_to_work(first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d"))
-    st.sidebar.success("確定しました（proposal→work）")
-    st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
-    st.session_state["skip_next_dateclick"] = True
-    st.rerun()
 
-st.sidebar.subheader("🗑 提案シフトの管理")
 
-if st.sidebar.button("今月の提案シフトを一括削除", use_container_width=True):
-    delete_proposals_in_range(
-        first.strftime("%Y-%m-%d"),
-        last.strftime("%Y-%m-%d"),
-    )
-    st.sidebar.success("今月の提案シフトをすべて削除しました")
-    st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
-    st.session_state["skip_next_dateclick"] = True
-    st.rerun()
+
+@st.fragment(run_every="10s")
+def watch_data_version(seen: int):
+    # 他のタブ・セッションでの変更を整数1つのポーリングで検知する
+    if get_data_version(current_user()) != seen:
+        st.rerun(scope="app")
 
 
-events_by_date = fetch_events_in_month(year, month)
+mark("sidebar")
+
+data_version = get_data_version(user_id)
+with st.sidebar:
+    watch_data_version(data_version)
+
+events_by_date = fetch_events_in_month(year, month, user_id)
+mark("fetch_events")
 
 # =========================
 # 📊 集計（proposal / work）
@@ -840,8 +432,7 @@ events_by_date = fetch_events_in_month(year, month)
 # 1) 月のイベントを平坦化
 flat = [ev for evs in events_by_date.values() for ev in evs]
 
-def build_shift_dataframe(events, category: str):
-    wages = get_wages()  
+def build_shift_rows(events, category: str, wages: dict[str, int]) -> list[dict]:
     rows = []
 
     for ev in events:
@@ -873,84 +464,131 @@ def build_shift_dataframe(events, category: str):
             "income": int(income),
         })
 
-    return pd.DataFrame(rows)
+    return rows
+
+
+def workplace_breakdown(rows: list[dict]):
+    import pandas as pd  # 店別内訳を出す時だけ読み込む
+
+    return (
+        pd.DataFrame(rows)
+        .groupby("workplace")[["hours", "income"]]
+        .sum()
+        .reset_index()
+    )
+
+
+def show_shift_summary(rows: list[dict], label: str, income_label: str):
+    if not rows:
+        st.info(f"この月の{label}がありません。")
+        return
+    c1, c2, c3 = st.columns(3)
+    c1.metric("件数", f"{len(rows)} 件")
+    c2.metric("合計労働時間", f"{sum(r['hours'] for r in rows):.1f} h")
+    c3.metric(income_label, f"{sum(r['income'] for r in rows):,} 円")
+
 
 # 2) proposal と work を両方作る
-df_proposal = build_shift_dataframe(flat, "proposal")
-df_work = build_shift_dataframe(flat, "work")
+summary_wages = get_wages(user_id)
+rows_proposal = build_shift_rows(flat, "proposal", summary_wages)
+rows_work = build_shift_rows(flat, "work", summary_wages)
 
 # 3) 表示
 st.subheader("📊 集計（この月）")
 
 # --- 提案 ---
 st.markdown("### 🧠 提案シフト（proposal）")
-if df_proposal.empty:
-    st.info("この月の提案シフト（proposal）がありません。")
-else:
-    c1, c2, c3 = st.columns(3)
-    c1.metric("件数", f"{len(df_proposal)} 件")
-    c2.metric("合計労働時間", f"{df_proposal['hours'].sum():.1f} h")
-    c3.metric("合計収入(概算)", f"{df_proposal['income'].sum():,} 円")
-
+show_shift_summary(rows_proposal, "提案シフト（proposal）", "合計収入(概算)")
+if rows_proposal:
     with st.expander("店別内訳（proposal）"):
-        st.dataframe(
-            df_proposal.groupby("workplace")[["hours", "income"]]
-            .sum()
-            .reset_index(),
-            use_container_width=True,
-        )
+        st.dataframe(workplace_breakdown(rows_proposal), use_container_width=True)
 
 # --- 確定 ---
 st.markdown("### ✅ 確定シフト（work）")
-if df_work.empty:
-    st.info("この月の確定シフト（work）がありません。")
-else:
+show_shift_summary(rows_work, "確定シフト（work）", "合計収入(確定)")
+if rows_work:
+    with st.expander("店別内訳（work）"):
+        st.dataframe(workplace_breakdown(rows_work), use_container_width=True)
+
+# --- What-if ---
+with st.expander("🔮 What-if（上限・時給を変えたら？）"):
+    st.caption("今月の予定に対して、上限と時給倍率の組み合わせをまとめて試算します（ゆらぎなし）")
     c1, c2, c3 = st.columns(3)
-    c1.metric("件数", f"{len(df_work)} 件")
-    c2.metric("合計労働時間", f"{df_work['hours'].sum():.1f} h")
-    c3.metric("合計収入(確定)", f"{df_work['income'].sum():,} 円")
+    wi_day = c1.slider("1日上限（時間）", 0, 12, (4, 8), key="wi_day")
+    wi_week = c2.slider("週上限（時間）", 0, 60, (10, 30), 5, key="wi_week")
+    wi_scales = c3.multiselect("時給倍率", [0.8, 0.9, 1.0, 1.1, 1.2], default=[1.0], key="wi_scales")
+    if st.button("まとめて計算", key="wi_run") and wi_scales:
+        t0 = perf_counter()
+        scenarios = build_scenarios(
+            list(range(wi_day[0], wi_day[1] + 1)),
+            list(range(wi_week[0], wi_week[1] + 1, 5)),
+            sorted(wi_scales),
+        )
+        st.session_state["whatif"] = (
+            ym_key, evaluate_scenarios(year, month, scenarios, st.session_state["avail_days"], user_id),
+            (perf_counter() - t0) * 1000,
+        )
+    if st.session_state.get("whatif") and st.session_state["whatif"][0] == ym_key:
+        import pandas as pd  # 結果を表・グラフにする時だけ
 
-    with st.expander("店別内訳（work）"):
-        st.dataframe(
-            df_work.groupby("workplace")[["hours", "income"]]
-            .sum()
-            .reset_index(),
-            use_container_width=True,
+        _, wi_rows, wi_ms = st.session_state["whatif"]
+        df_wi = pd.DataFrame(wi_rows).rename(columns={
+            "max_day": "1日上限", "max_week": "週上限", "wage_scale": "時給倍率",
+            "hours": "時間", "income": "収入", "workdays": "勤務日数",
+        })
+        st.caption(f"{len(df_wi)}シナリオ / {wi_ms:.0f} ms")
+        df_wi["1日上限"] = df_wi["1日上限"].astype(str)
+        st.scatter_chart(df_wi, x="週上限", y="収入", color="1日上限")
+        st.dataframe(df_wi, use_container_width=True, hide_index=True)
+
+# --- 空き時間 ---
+with st.expander("🔍 空き時間を探す"):
+    st.caption(f"授業・仕事・私用・勤務・提案の前後{BUFFER_BEFORE_AFTER_MIN}分も空いていない扱いです")
+    c1, c2 = st.columns(2)
+    fs_range = c1.date_input("期間", (first, last), key="fs_range")
+    fs_hours = c2.number_input("最低何時間", 0.5, 12.0, 2.0, 0.5, key="fs_hours")
+    c3, c4 = st.columns(2)
+    fs_from = c3.time_input("何時から", _t(DEFAULT_DAY_START), step=1800, key="fs_from")
+    fs_to = c4.time_input("何時まで", _t(DEFAULT_DAY_END), step=1800, key="fs_to")
+    if st.button("探す", key="fs_run") and len(fs_range) == 2:
+        t0 = perf_counter()
+        fs_rows = find_free_slots(
+            fs_range[0], fs_range[1], int(fs_hours * 60),
+            fs_from.strftime("%H:%M"), fs_to.strftime("%H:%M"), user_id,
         )
+        st.caption(f"{len(fs_rows)}件 / {(perf_counter() - t0) * 1000:.0f} ms")
+        st.text("\n".join(
+            f"{r['date']}  {r['start']}〜{r['end']}  ({r['minutes'] / 60:g}h)" for r in fs_rows
+        ) or "条件に合う空き時間はありません")
+
+# --- CSV書き出し ---
+with st.expander("📤 CSVで書き出す"):
+    c1, c2 = st.columns(2)
+    ex_start = c1.date_input("開始日", date(year, 1, 1), key="ex_start")
+    ex_end = c2.date_input("終了日", date(year, 12, 31), key="ex_end")
+    # 押された時に初めて作る。DBからはチャンクずつ読むが、出来上がったCSVは
+    # Streamlit が丸ごとメモリに持って送る（何年分もなら tools/export_csv.py）
+    st.download_button(
+        "CSVをダウンロード",
+        data=lambda: events_csv_file(ex_start.strftime("%Y-%m-%d"), ex_end.strftime("%Y-%m-%d"), user_id),
+        file_name=f"events_{user_id}_{ex_start}_{ex_end}.csv",
+        mime="text/csv",
+        key="ex_download",
+    )
+mark("summary")
+
 
-fc_events = []
-for day_key, evs in events_by_date.items():
-    for ev in evs:
-        if ev["start"] and ev["end"]:
-            start = f"{day_key}T{ev['start']}:00"
-            end = f"{day_key}T{ev['end']}:00"
-            all_day_flag = False
-        else:
-            start = day_key
-            end = day_key
-            all_day_flag = True
-
-        item = {
-            "id": str(ev["id"]),
-            "title": format_event_label(ev),
-            "start": start,
-            "end": end,
-            "allDay": all_day_flag,
-        }
-
-        # proposalは店名(place)で色分け
-        if ev["category"] == "proposal":
-            if ev["place"] == "サンマルク":
-                item["backgroundColor"] = "#FFCC80"
-                item["borderColor"] = "#FB8C00"
-                item["textColor"] = "#000000"
-            elif ev["place"] == "成城石井":
-                item["backgroundColor"] = "#FC7B71F5"
-                item["borderColor"] = "#CB886E"
-                item["textColor"] = "#000000"
-
-        fc_events.append(item)
 
+@st.cache_resource(max_entries=64, show_spinner=False)
+def calendar_payload(user_id: str, year: int, month: int, data_version: int,
+                     _events_by_date: dict[str, list[dict]]) -> tuple[list[dict], str]:
+    # (ユーザー, 月, データ版) ごとに1回だけ組み立てる。
+    # cache_resource なので毎回pickleし直さず同じオブジェクトを返す（変更しないこと）
+    fc = build_fc_events(_events_by_date)
+    return fc, payload_hash(fc)
+
+
+fc_events, fc_hash = calendar_payload(user_id, year, month, data_version, events_by_date)
 
 calendar_options = {
     "initialView": "dayGridMonth",
@@ -969,13 +607,18 @@ calendar_options = {
 
 }
 
+from streamlit_calendar import calendar as st_calendar  # カレンダー描画の直前まで遅らせる
+
 cal_gen = st.session_state.get("cal_gen", 0)
+
 state = st_calendar(
     events=fc_events,
     options=calendar_options,
     callbacks=["dateClick", "eventClick", "datesSet"],
-    key=f"calendar_{year}_{month}_{cal_gen}",
+    # 内容が同じでも、ダイアログなどで処理したクリックを捨てるため cal_gen でも作り直す
+    key=f"calendar_{user_id}_{year}_{month}_{fc_hash}_{cal_gen}",
 )
+mark("calendar")
 
 if state and state.get("datesSet"):
     ds = state["datesSet"]
@@ -1021,10 +664,11 @@ else:
             event_id = (ec.get("event", {}) or {}).get("id") or ec.get("id")
 
         if event_id is not None:
-            target = fetch_event_by_id(int(event_id))
+            target = fetch_event_by_id(int(event_id), user_id)
             if target:
                 show_edit_event_dialog(target)
             else:
+                st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
                 st.warning("この予定が見つかりませんでした")
             st.stop()  
 
@@ -1063,7 +707,15 @@ else:
 
             
             if c2.button("削除", key=f"del_{ev['id']}_{i}", use_container_width=True):
-                delete_event(int(ev["id"]))
+                delete_event(int(ev["id"]), user_id)
                 st.session_state["cal_gen"] = st.session_state.get("cal_gen", 0) + 1
                 st.session_state["skip_next_dateclick"] = True
                 st.rerun()
+
+mark("event_list")
+
+# ⏱ 起動時間（ms）
+with st.sidebar.expander("⏱ 起動時間"):
+    st.caption(f"init_db（プロセスで1回）：{init_db_ms:.1f} ms")
+    st.text("\n".join(f"{k:<12} {v:8.1f}" for k, v in timings))
+    st.caption(f"合計：{(perf_counter() - _T0) * 1000:.1f} ms")
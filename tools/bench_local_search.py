@@ -0,0 +1,82 @@
+"""貪欲法と局所探索の比較ベンチマーク。
+
+    python tools/bench_local_search.py [--weeks 40] [--budget-ms 200]
+
+ランダムな予定の週を作り、同じ入力・seedで両方のエンジンを走らせて
+目的関数（optimizer.plan_score）・収入・時間・1秒あたりの手数を表示する。
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import propose_week_fixed_slots  # noqa: E402
+from optimizer import plan_score, propose_week_local_search  # noqa: E402
+
+CATEGORIES = ["class", "job", "private", "work"]
+
+
+def random_week(rnd: random.Random):
+    ws = date(2026, 1, 5) + timedelta(days=7 * rnd.randrange(52))
+    events = []
+    for _ in range(rnd.randrange(0, 10)):
+        d = ws + timedelta(days=rnd.randrange(7))
+        h = rnd.randrange(8, 21)
+        events.append({
+            "date": d.isoformat(),
+            "start": f"{h:02d}:00",
+            "end": f"{h + rnd.randrange(1, 3):02d}:30",
+            "category": rnd.choice(CATEGORIES),
+        })
+    wages = {"サンマルク": rnd.randrange(1050, 1400), "成城石井": rnd.randrange(1050, 1400)}
+    return ws, events, wages, rnd.randrange(4, 9), rnd.randrange(10, 30)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weeks", type=int, default=40)
+    ap.add_argument("--budget-ms", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    g_score = l_score = g_income = l_income = 0
+    g_time = 0.0
+    rates = []
+    better = 0
+    for k in range(args.weeks):
+        ws, events, wages, max_day, max_week = random_week(rnd)
+
+        t = perf_counter()
+        g = propose_week_fixed_slots(ws, max_day, max_week, wages, events, seed=k)
+        g_time += perf_counter() - t
+
+        stats: dict = {}
+        ls = propose_week_local_search(
+            ws, max_day, max_week, wages, events, seed=k, budget_ms=args.budget_ms, stats=stats
+        )
+        assert sum(p["hours"] for p in ls) <= max_week
+
+        gs, lsc = plan_score(g, events), plan_score(ls, events)
+        g_score += gs
+        l_score += lsc
+        g_income += sum(p["income"] for p in g)
+        l_income += sum(p["income"] for p in ls)
+        better += lsc > gs
+        rates.append(stats.get("moves_per_sec", 0.0))
+
+    print(f"weeks={args.weeks} budget={args.budget_ms}ms")
+    print(f"greedy       score={g_score:>10,} income={g_income:>10,}  {g_time / args.weeks * 1000:.1f} ms/week")
+    print(f"local search score={l_score:>10,} income={l_income:>10,}  {args.budget_ms} ms/week")
+    print(f"improved weeks: {better}/{args.weeks}  score gain: {(l_score - g_score) / max(abs(g_score), 1):+.2%}")
+    if rates:
+        print(f"moves/sec: median {sorted(rates)[len(rates) // 2]:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
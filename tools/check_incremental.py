@@ -0,0 +1,219 @@
+"""変更のあった週だけの再提案が、月全体の作り直しと同じ結果になるかの確認。
+
+    python tools/check_incremental.py [--trials 30] [--seed 0]
+
+一時ディレクトリに新しい app.db を作り、試行ごとに別のユーザーで
+予定・時給・上限を入れて generate_month_proposals で提案を作る。そのうえで
+
+1. 同じseedで作り直しても提案のidもデータ版（get_data_version）も変わらない
+2. 月の中の1日と、月をまたぐ週の隣の月の1日の予定を変え、ときどき
+   上限・時給・曜日の設定も変えてから
+   regenerate_changed_weeks した結果が、同じ時点のDBのコピーで
+   generate_month_proposals（同じseed）した結果と同じ
+3. その後に同じseedで月全体を作り直しても、idもデータ版も変わらない
+
+を確かめる。一致しない試行があれば終了コード1。
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EDIT_CATEGORIES = ["class", "job", "private", "work"]
+
+
+# ---------- Setup ----------
+def copy_app(dst: str):
+    for n in os.listdir(APP_DIR):
+        if n.endswith(".py"):
+            shutil.copy(os.path.join(APP_DIR, n), os.path.join(dst, n))
+
+
+def random_row(rnd: random.Random, d: date, category: str) -> tuple:
+    if rnd.random() < 0.1:
+        return (d.isoformat(), None, None, category, "終日", None)
+    h = rnd.randrange(7, 21)
+    return (d.isoformat(), f"{h:02d}:{rnd.choice(['00', '30'])}", f"{min(h + rnd.randrange(1, 5), 23):02d}:00",
+            category, "予定", None)
+
+
+def seed_user(rnd: random.Random, user_id: str, year: int, month: int):
+    from db import add_events, upsert_settings, upsert_wage
+    from engine import month_horizon
+
+    h_start, h_end = month_horizon(year, month)
+    upsert_settings(rnd.randrange(3, 11), rnd.randrange(10, 41), user_id)
+    upsert_wage("サンマルク", rnd.randrange(1000, 1500), user_id)
+    upsert_wage("成城石井", rnd.randrange(1000, 1500), user_id)
+    add_events([
+        random_row(rnd, h_start + timedelta(days=rnd.randrange((h_end - h_start).days + 1)),
+                   rnd.choice(EDIT_CATEGORIES))
+        for _ in range(rnd.randrange(5, 50))
+    ], user_id)
+
+
+# ---------- Checks ----------
+def month_proposals(year: int, month: int, user_id: str) -> list[tuple]:
+    from db import fetch_events_in_month
+
+    return sorted(
+        (ev["id"], ev["date"], ev["start"], ev["end"], ev["place"])
+        for evs in fetch_events_in_month(year, month, user_id).values()
+        for ev in evs if ev["category"] == "proposal"
+    )
+
+
+def without_ids(rows: list[tuple]) -> list[tuple]:
+    return sorted(r[1:] for r in rows)
+
+
+def rerun_is_stable(year: int, month: int, seed: int, avail, user_id: str) -> str | None:
+    # 同じseedで作り直しても何も書かないこと
+    from db import get_data_version
+    from planner import generate_month_proposals
+
+    before, version = month_proposals(year, month, user_id), get_data_version(user_id)
+    generate_month_proposals(year, month, seed, avail, user_id)
+    after = month_proposals(year, month, user_id)
+    if after != before:
+        return f"ids changed on rerun ({len(before)} -> {len(after)} proposals)"
+    if get_data_version(user_id) != version:
+        return f"data version changed on rerun ({version} -> {get_data_version(user_id)})"
+    return None
+
+
+def edit_days(rnd: random.Random, year: int, month: int, user_id: str) -> list[str]:
+    # 月の中の1日と、月をまたぐ週の隣の月の1日（無ければ月の中だけ）の予定を変える
+    from db import add_events, delete_event, fetch_events_between, update_event
+    from engine import month_horizon, month_range
+
+    first, last = month_range(year, month)
+    h_start, h_end = month_horizon(year, month)
+    days = [first + timedelta(days=rnd.randrange((last - first).days + 1))]
+    outside = [h_start + timedelta(days=i) for i in range((first - h_start).days)]
+    outside += [last + timedelta(days=i + 1) for i in range((h_end - last).days)]
+    if outside:
+        days.append(rnd.choice(outside))
+
+    for d in days:
+        ds = d.isoformat()
+        existing = [e for e in fetch_events_between(ds, ds, user_id) if e["category"] != "proposal"]
+        op = rnd.choice(["add", "update", "delete"]) if existing else "add"
+        if op == "add":
+            add_events([random_row(rnd, d, rnd.choice(EDIT_CATEGORIES))], user_id)
+        elif op == "delete":
+            delete_event(rnd.choice(existing)["id"], user_id)
+        else:
+            ev = rnd.choice(existing)
+            row = random_row(rnd, d, rnd.choice(EDIT_CATEGORIES))
+            update_event(ev["id"], *row, user_id=user_id)
+    return [d.isoformat() for d in days]
+
+
+def change_params(rnd: random.Random, avail, user_id: str):
+    # 予定以外の入力を1つ変える（変えない試行もある）。新しい avail_days を返す
+    from db import get_settings, upsert_settings, upsert_wage
+
+    op = rnd.choice(["none", "none", "settings", "wage", "avail"])
+    if op == "settings":
+        max_day, max_week = get_settings(user_id)
+        upsert_settings(max(2, max_day - rnd.randrange(1, 4)), max(4, max_week - rnd.randrange(2, 12)), user_id)
+    elif op == "wage":
+        upsert_wage(rnd.choice(["サンマルク", "成城石井"]), rnd.randrange(1000, 1500), user_id)
+    elif op == "avail":
+        avail = {w: [rnd.random() < 0.6 for _ in range(7)] for w in ("サンマルク", "成城石井")}
+    return op, avail
+
+
+def full_regeneration(year: int, month: int, seed: int, avail, user_id: str, copy_path: str) -> list[tuple]:
+    # 今のDBをコピーして、そちらで月全体を作り直した結果
+    import db
+    from planner import generate_month_proposals
+
+    src, dst = sqlite3.connect(db.DB_PATH), sqlite3.connect(copy_path)
+    src.backup(dst)
+    src.close()
+    dst.close()
+    main_path = db.DB_PATH
+    db.DB_PATH = copy_path
+    try:
+        generate_month_proposals(year, month, seed, avail, user_id)
+        return month_proposals(year, month, user_id)
+    finally:
+        db.DB_PATH = main_path
+        os.remove(copy_path)
+
+
+def run_trial(k: int, rnd: random.Random, work: str) -> list[str]:
+    from planner import generate_month_proposals, regenerate_changed_weeks
+
+    year, month = 2025 + rnd.randrange(2), rnd.randrange(1, 13)
+    user_id = f"trial{k}"
+    seed = rnd.randrange(1000)
+    avail = None
+    if rnd.random() < 0.5:
+        avail = {w: [rnd.random() < 0.75 for _ in range(7)] for w in ("サンマルク", "成城石井")}
+    seed_user(rnd, user_id, year, month)
+    generate_month_proposals(year, month, seed, avail, user_id)
+
+    problems = []
+    err = rerun_is_stable(year, month, seed, avail, user_id)
+    if err:
+        problems.append(f"first rerun: {err}")
+
+    edited = edit_days(rnd, year, month, user_id)
+    changed, avail = change_params(rnd, avail, user_id)
+    expected = full_regeneration(year, month, seed, avail, user_id, os.path.join(work, f"full{k}.db"))
+    result = regenerate_changed_weeks(year, month, avail, user_id)
+    if result is None:
+        problems.append("regenerate_changed_weeks returned None")
+        return problems
+    got = month_proposals(year, month, user_id)
+    if without_ids(got) != without_ids(expected):
+        problems.append(
+            f"edited {edited} (params: {changed}), regenerated {[ws.isoformat() for ws in result[0]]}: "
+            f"{len(got)} vs {len(expected)} proposals after full regeneration"
+        )
+    err = rerun_is_stable(year, month, seed, avail, user_id)
+    if err:
+        problems.append(f"rerun after regenerate: {err}")
+    return [f"trial {k} ({year}-{month:02d}, seed={seed}) {p}" for p in problems]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--trials", type=int, default=30)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--keep", action="store_true", help="一時ディレクトリを残す")
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="check-incremental-")
+    copy_app(work)
+    os.chdir(work)
+    sys.path.insert(0, work)
+    from db import init_db
+
+    init_db()
+    rnd = random.Random(args.seed)
+    failed = []
+    for k in range(args.trials):
+        failed += run_trial(k, rnd, work)
+    for msg in failed:
+        print(msg)
+    print(f"{args.trials} trials: {'OK' if not failed else f'{len(failed)} problems'}")
+
+    if not args.keep:
+        os.chdir(APP_DIR)
+        shutil.rmtree(work, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
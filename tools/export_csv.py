@@ -0,0 +1,40 @@
+"""予定をCSVファイルに書き出す（画面のダウンロードを通さない）。
+
+    python tools/export_csv.py START END OUT.csv [--user default] [--db app.db]
+
+画面のダウンロードボタンは、出来上がったCSVを Streamlit がまるごとメモリに
+持ってから送る。何年分もの書き出しはこちらを使うと、読み込みから書き込みまで
+チャンクずつ流れるので、期間の長さに関係なくメモリは一定で済む。
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+from exports import write_events_csv  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("start", help="YYYY-MM-DD")
+    ap.add_argument("end", help="YYYY-MM-DD（この日も含む）")
+    ap.add_argument("out")
+    ap.add_argument("--user", default=db.DEFAULT_USER)
+    ap.add_argument("--db", default=db.DB_PATH, help="archive.db は同じディレクトリのものを使う")
+    args = ap.parse_args()
+
+    db.DB_PATH = args.db
+    db.ARCHIVE_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(args.db)), "archive.db")
+    t = perf_counter()
+    with open(args.out, "w", encoding="utf-8-sig", newline="") as f:
+        n = write_events_csv(f, args.start, args.end, args.user)
+    print(f"{n} events -> {args.out} ({perf_counter() - t:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
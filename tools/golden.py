@@ -0,0 +1,153 @@
+"""提案エンジンのゴールデン出力との比較。
+
+    python tools/golden.py              # golden/*.json を全部の実装で確かめる
+    python tools/golden.py --record     # golden/ を作り直す（出力を変える変更をした時だけ）
+
+golden/*.json は engine_api.propose の (入力, 計画) の記録。
+VARIANTS に並べた実装はどれも、同じ入力に対して記録と同じ計画を返す必要がある。
+速い実装を足す時はここに登録して、一致を確かめてから置き換える。
+局所探索は時間で打ち切るので結果が決まらず、対象にしない。
+"""
+from __future__ import annotations
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+from datetime import timedelta
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import iter_week_starts_in_month, month_horizon, month_range, propose_week_fixed_slots  # noqa: E402
+from engine_api import API_VERSION, PLAN_KEYS, neighbour_hours, propose, week_seed  # noqa: E402
+
+GOLDEN_DIR = os.path.join(ROOT, "golden")
+CATEGORIES = ["class", "job", "private", "work", "proposal", "other"]
+
+
+# ---------- Variants ----------
+def _events(req: dict) -> list[dict]:
+    return [dict(e, id=0, title="", place=None) for e in req["events"]]
+
+
+def week_by_week(req: dict) -> list[dict]:
+    # 索引を使い回さない素直な実装（変更前の planner と同じ流れ）
+    year, month = req["year"], req["month"]
+    first, last = month_range(year, month)
+    events = _events(req)
+    plan = []
+    for wi, ws in enumerate(iter_week_starts_in_month(year, month)):
+        allowed = {
+            d.strftime("%Y-%m-%d") for d in (ws + timedelta(days=i) for i in range(7)) if first <= d <= last
+        }
+        picked = propose_week_fixed_slots(
+            ws, req["max_day"], req["max_week"], req["wages"], events, seed=week_seed(req["seed"], wi),
+            avail_days=req.get("avail_days"), allowed_dates=allowed,
+            week_hours_used=neighbour_hours(events, ws, allowed),
+        )
+        plan += picked
+        events += [
+            {"id": -1, "date": p["date"], "start": p["start"], "end": p["end"],
+             "category": "proposal", "title": p["workplace"], "place": p["workplace"]}
+            for p in picked
+        ]
+    return plan
+
+
+VARIANTS = {
+    "engine_api.propose": lambda req: propose(req)["plan"],
+    "week_by_week": week_by_week,
+}
+
+
+def normalize(plan: list[dict]) -> list[dict]:
+    return sorted(({k: p[k] for k in PLAN_KEYS} for p in plan), key=lambda p: (p["date"], p["start"]))
+
+
+# ---------- Corpus ----------
+def random_request(rnd: random.Random) -> dict:
+    year, month = 2025 + rnd.randrange(2), rnd.randrange(1, 13)
+    h_start, h_end = month_horizon(year, month)
+    events = []
+    for _ in range(rnd.randrange(5, 60)):
+        d = h_start + timedelta(days=rnd.randrange((h_end - h_start).days + 1))
+        if rnd.random() < 0.08:
+            events.append({"date": d.isoformat(), "start": None, "end": None,
+                           "category": rnd.choice(CATEGORIES)})
+            continue
+        h = rnd.randrange(7, 21)
+        events.append({"date": d.isoformat(), "start": f"{h:02d}:{rnd.choice(['00', '30'])}",
+                       "end": f"{min(h + rnd.randrange(1, 5), 23):02d}:00", "category": rnd.choice(CATEGORIES)})
+    events.sort(key=lambda e: (e["date"], e["start"] or ""))
+    wages = {"サンマルク": rnd.randrange(1000, 1500), "成城石井": rnd.randrange(1000, 1500)}
+    if rnd.random() < 0.15:
+        wages[rnd.choice(list(wages))] = 0
+    avail = None
+    if rnd.random() < 0.5:
+        avail = {w: [rnd.random() < 0.75 for _ in range(7)] for w in wages}
+    return {
+        "api_version": API_VERSION, "year": year, "month": month, "seed": rnd.randrange(1000),
+        "max_day": rnd.randrange(3, 11), "max_week": rnd.randrange(6, 41),
+        "wages": wages, "avail_days": avail, "events": events, "engine": "greedy",
+    }
+
+
+def record(n: int, seed: int):
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for old in glob.glob(os.path.join(GOLDEN_DIR, "*.json")):
+        os.remove(old)
+    rnd = random.Random(seed)
+    for k in range(n):
+        req = random_request(rnd)
+        name = f"case_{k:03d}_{req['year']}-{req['month']:02d}.json"
+        with open(os.path.join(GOLDEN_DIR, name), "w", encoding="utf-8") as f:
+            json.dump({"request": req, "plan": propose(req)["plan"]}, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+    print(f"recorded {n} cases in {GOLDEN_DIR}")
+
+
+# ---------- Check ----------
+def check() -> int:
+    paths = sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.json")))
+    if not paths:
+        print("golden/ が空です（--record で作る）")
+        return 1
+    failed = 0
+    times = {name: 0.0 for name in VARIANTS}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            case = json.load(f)
+        expected = normalize(case["plan"])
+        for name, fn in VARIANTS.items():
+            t = perf_counter()
+            got = normalize(fn(case["request"]))
+            times[name] += perf_counter() - t
+            if got != expected:
+                failed += 1
+                diff = next((i for i, (a, b) in enumerate(zip(got, expected)) if a != b),
+                            min(len(got), len(expected)))
+                print(f"DIFF {os.path.basename(path)} [{name}] {len(got)} vs {len(expected)} picks, "
+                      f"first difference at #{diff}")
+    for name, t in times.items():
+        print(f"{name:<22} {t / len(paths) * 1000:7.1f} ms/case")
+    print(f"{len(paths)} cases x {len(VARIANTS)} variants: {'OK' if not failed else f'{failed} mismatches'}")
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--record", action="store_true")
+    ap.add_argument("--cases", type=int, default=24)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if args.record:
+        record(args.cases, args.seed)
+    else:
+        sys.exit(check())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""streamlit_app.py の負荷試験。
+
+    python tools/loadtest.py [--users 8] [--actions 20] [--months 6] [--seed 0]
+
+一時ディレクトリにアプリをコピーして新しい app.db を作り、ユーザーごとに
+予定・時給を入れておく。そのうえで仮想ユーザー（AppTest 1つ = 1セッション）を
+それぞれ別プロセスで同時に走らせ、月の移動・まとめて追加・提案・確定・削除を
+ランダムな順に繰り返す。オフライン・1台で完結する。
+
+AppTest は Streamlit の Runtime などプロセスで1つの状態を使うので、
+同じプロセスの複数スレッドで回すと互いに壊し合う。そのためプロセスを分けている。
+本物のサーバーは1プロセスで書き込みスレッドも1本だが、ここではプロセスごとに
+書き込みスレッドがあるので、書き込みのロック待ちは実際より多めに出る。
+
+出力：全体のスループット、操作ごとの遅延（p50/p90/p99/max）とエラー数、
+読み込み側（db.get_conn の接続・execute・fetch）の時間、
+書き込みスレッドのキュー待ち・ロック待ち（writer.DbWriter.stats の合計）。
+例外が出た回・描画が空だった回もエラーとして数え、遅延にも含める。
+
+まとめて追加のダイアログはカレンダーのクリックから開くので AppTest では押せない。
+代わりにダイアログと同じ add_events を呼んでから再描画したものを計る。
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import multiprocessing
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+from time import perf_counter
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 操作と重み（だいたい実際の使われ方の割合）
+ACTIONS = {
+    "navigate": 5,
+    "bulk_add": 3,
+    "propose": 2,
+    "regenerate": 1,
+    "confirm": 1,
+    "delete": 2,
+}
+CATEGORIES = ["class", "job", "private", "work"]
+
+
+# ---------- Setup ----------
+def copy_app(dst: str):
+    # .py とページだけ（app.db や archive.db は持ってこない）
+    for n in os.listdir(APP_DIR):
+        p = os.path.join(APP_DIR, n)
+        if n.endswith(".py") or n in ("pages", ".streamlit"):
+            (shutil.copytree if os.path.isdir(p) else shutil.copy)(p, os.path.join(dst, n))
+
+
+def random_rows(rnd: random.Random, first: date, n: int) -> list[tuple]:
+    rows = []
+    for _ in range(n):
+        d = first + timedelta(days=rnd.randrange(28))
+        if rnd.random() < 0.1:
+            rows.append((d.isoformat(), None, None, rnd.choice(CATEGORIES), "終日", None))
+            continue
+        h = rnd.randrange(8, 20)
+        rows.append((d.isoformat(), f"{h:02d}:00", f"{h + rnd.randrange(1, 4):02d}:00",
+                     rnd.choice(CATEGORIES), "予定", None))
+    return rows
+
+
+def seed_db(users: list[str], months: list[tuple[int, int]], per_month: int, rnd: random.Random):
+    from db import add_events, init_db, upsert_settings, upsert_wage
+
+    init_db()
+    for u in users:
+        upsert_settings(8, 28, u)
+        upsert_wage("サンマルク", rnd.randrange(1050, 1300), u)
+        upsert_wage("成城石井", rnd.randrange(1050, 1300), u)
+        for y, m in months:
+            add_events(random_rows(rnd, date(y, m, 1), per_month), u)
+
+
+# ---------- Reader timing ----------
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, *a):
+        return _timed("execute", super().execute, *a)
+
+    def executemany(self, *a):
+        return _timed("execute", super().executemany, *a)
+
+    def fetchone(self):
+        return _timed("fetch", super().fetchone)
+
+    def fetchmany(self, *a):
+        return _timed("fetch", super().fetchmany, *a)
+
+    def fetchall(self):
+        return _timed("fetch", super().fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *a):
+        return self.cursor().execute(*a)
+
+
+_reader = {"connect": [], "execute": [], "fetch": [], "locked": 0}
+
+
+def _timed(kind: str, fn, *a):
+    t = perf_counter()
+    try:
+        return fn(*a)
+    except sqlite3.OperationalError as e:
+        if "locked" in str(e):
+            _reader["locked"] += 1
+        raise
+    finally:
+        _reader[kind].append(perf_counter() - t)
+
+
+def time_readers():
+    # 画面側の読み込み（db.get_conn の接続・クエリ・取り出し）の時間を計る。
+    # ロック待ちは sqlite3 の中（busy timeout）で起きるので execute の時間に含まれる
+    import db
+
+    def get_conn():
+        t = perf_counter()
+        conn = sqlite3.connect(db.DB_PATH, timeout=30, check_same_thread=False, factory=TimedConnection)
+        _reader["connect"].append(perf_counter() - t)
+        return conn
+
+    db.get_conn = get_conn
+
+
+# ---------- Virtual user ----------
+def click_sidebar(at, label: str):
+    for b in at.sidebar.button:
+        if b.label == label:
+            b.click().run()
+            return True
+    return False
+
+
+def run_action(at, name: str, user_id: str, months: list[tuple[int, int]], rnd: random.Random):
+    from db import add_events
+
+    if name == "navigate":
+        y, m = rnd.choice(months)
+        at.number_input(key="year").set_value(y)
+        at.number_input(key="month").set_value(m).run()
+    elif name == "bulk_add":
+        y, m = int(at.session_state["year"]), int(at.session_state["month"])
+        add_events(random_rows(rnd, date(y, m, 1), rnd.randrange(1, 6)), user_id)
+        at.run()
+    elif name == "propose":
+        click_sidebar(at, "今月の提案を作成")
+    elif name == "regenerate":
+        click_sidebar(at, "変更のあった週だけ再提案")
+    elif name == "confirm":
+        click_sidebar(at, "今月の提案を確定（workへ）")
+    elif name == "delete":
+        buttons = [b for b in at.button if (b.key or "").startswith("del_")]
+        if buttons:
+            rnd.choice(buttons).click().run()
+        else:
+            at.run()
+
+
+def virtual_user(k: int, work: str, args, months, start, out):
+    # 1プロセス = 1セッション。Runtime などの Streamlit の状態をプロセスごとに持たせる
+    os.chdir(work)
+    sys.path.insert(0, work)
+    records: list[tuple[str, float, str | None]] = []
+    try:
+        from streamlit.testing.v1 import AppTest
+        from writer import get_writer
+
+        time_readers()
+        rnd = random.Random(args.seed * 1000 + k)
+        user_id = f"vu{k}"
+        at = AppTest.from_file(os.path.join(work, "streamlit_app.py"), default_timeout=120)
+        at.session_state["user_id"] = user_id
+        at.session_state["year"], at.session_state["month"] = months[0]
+        names, weights = list(ACTIONS), list(ACTIONS.values())
+        plan = ["open"] + rnd.choices(names, weights, k=args.actions)
+    except Exception as e:
+        out.put((k, [("setup", 0.0, repr(e))], _reader, None))
+        start.abort()
+        return
+
+    start.wait()
+    for name in plan:
+        t = perf_counter()
+        err = None
+        try:
+            if name == "open":
+                at.run()
+            else:
+                run_action(at, name, user_id, months, rnd)
+        except Exception as e:  # 1セッションの失敗で全体を止めない
+            err = repr(e)
+        dt = perf_counter() - t
+        # 描画が空・例外が出た回も遅延に含めてエラーに数える
+        if err is None and at.exception:
+            err = str(at.exception[0].value)
+        elif err is None and not at.title:
+            err = "empty render"
+        records.append((name, dt, err))
+    out.put((k, records, _reader, get_writer("app.db").stats()))
+
+
+# ---------- Report ----------
+def percentile(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+def sum_writer_stats(stats: list[dict]) -> dict:
+    total = {k: 0 for k in stats[0]} if stats else {}
+    for st in stats:
+        for k, v in st.items():
+            total[k] = max(total[k], v) if k.endswith("_max_s") else total[k] + v
+    return total
+
+
+def report(records, wall: float, reader: dict, writer_stats: dict):
+    failed = [(name, err) for name, _, err in records if err]
+    ok = len(records) - len(failed)
+    print(f"actions={len(records)}  ok={ok}  failed={len(failed)}  wall={wall:.1f}s  "
+          f"throughput={ok / wall:.2f} ok/s")
+    print(f"{'action':<12}{'n':>5}{'err':>5}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}   (ms)")
+    by_name: dict[str, list[float]] = {}
+    errs_by_name: dict[str, int] = {}
+    for name, dt, err in records:
+        by_name.setdefault(name, []).append(dt * 1000)
+        errs_by_name[name] = errs_by_name.get(name, 0) + bool(err)
+    for name in ["setup", "open", *ACTIONS]:
+        xs = by_name.get(name)
+        if not xs:
+            continue
+        print(f"{name:<12}{len(xs):>5}{errs_by_name[name]:>5}{percentile(xs, 50):>9.0f}{percentile(xs, 90):>9.0f}"
+              f"{percentile(xs, 99):>9.0f}{max(xs):>9.0f}")
+
+    print("reader (db.get_conn):")
+    for kind in ("connect", "execute", "fetch"):
+        xs = [x * 1000 for x in reader[kind]]
+        if xs:
+            print(f"  {kind:<9}{len(xs):>7}  p50 {percentile(xs, 50):.2f}  p99 {percentile(xs, 99):.2f}"
+                  f"  max {max(xs):.1f} ms")
+    print(f"  database is locked: {reader['locked']}")
+
+    s = writer_stats
+    if s:
+        n = max(s["items"], 1)
+        print(f"writer: {s['items']} writes in {s['batches']} commits, {s['errors']} failed")
+        print(f"  queue wait  avg {s['queue_wait_s'] / n * 1000:.2f} ms  max {s['queue_wait_max_s'] * 1000:.1f} ms")
+        print(f"  lock wait   avg {s['lock_wait_s'] / max(s['batches'], 1) * 1000:.2f} ms/commit"
+              f"  max {s['lock_wait_max_s'] * 1000:.1f} ms  (BEGIN IMMEDIATE)")
+    locked = sum("locked" in str(err) for _, err in failed)
+    print(f"errors: {len(failed)} (database is locked: {locked}, "
+          f"empty renders: {sum(err == 'empty render' for _, err in failed)})")
+    for name, err in failed[:5]:
+        print(f"  [{name}] {str(err)[:160]}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=8)
+    ap.add_argument("--actions", type=int, default=20, help="1ユーザーあたりの操作数")
+    ap.add_argument("--months", type=int, default=6)
+    ap.add_argument("--events-per-month", type=int, default=30)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--keep", action="store_true", help="一時ディレクトリを残す")
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="loadtest-")
+    copy_app(work)
+    os.chdir(work)
+    sys.path.insert(0, work)
+
+    rnd = random.Random(args.seed)
+    first = date.today().replace(day=1)
+    months = []
+    for i in range(args.months):
+        y, m = divmod(first.month - 1 + i, 12)
+        months.append((first.year + y, m + 1))
+    users = [f"vu{k}" for k in range(args.users)]
+    t = perf_counter()
+    seed_db(users, months, args.events_per_month, rnd)
+    print(f"seeded {len(users)} users x {len(months)} months in {perf_counter() - t:.1f}s ({work})")
+
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Barrier(args.users + 1)
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=virtual_user, args=(k, work, args, months, start, out))
+        for k in range(args.users)
+    ]
+    for p in procs:
+        p.start()
+    # 全員が AppTest を用意し終えてから計り始める
+    try:
+        start.wait()
+    except threading.BrokenBarrierError:
+        pass
+    t = perf_counter()
+    records: list = []
+    reader = {"connect": [], "execute": [], "fetch": [], "locked": 0}
+    writer_stats = []
+    for _ in procs:
+        k, recs, r, w = out.get()
+        records += recs
+        for kind in ("connect", "execute", "fetch"):
+            reader[kind] += r[kind]
+        reader["locked"] += r["locked"]
+        if w:
+            writer_stats.append(w)
+    wall = perf_counter() - t
+    for p in procs:
+        p.join()
+
+    report(records, wall, reader, sum_writer_stats(writer_stats))
+
+    if not args.keep:
+        os.chdir(APP_DIR)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from datetime import timedelta
+from itertools import product
+
+from db import DEFAULT_USER, get_wages
+from engine import (
+    DAY_HOURS_PENALTY, WORKDAY_PENALTY, build_week_candidates, busy_day_penalty, busy_events,
+    iter_week_starts_in_month, month_range, shifts_conflict,
+)
+from engine_api import neighbour_hours
+from planner import horizon_snapshot
+
+
+# ---------- What-if ----------
+# 上限・時給の組み合わせ（シナリオ）をまとめて評価する。
+# 週ごとの候補は1回だけ作り、全シナリオの貪欲選択を numpy で同時に進める。
+# 提案の乱数ゆらぎは入れない（同点は候補順）ので、実際の提案とは数時間ずれることがある
+def build_scenarios(max_days: list[int], max_weeks: list[int], wage_scales: list[float]) -> list[dict]:
+    return [
+        {"max_day": d, "max_week": w, "wage_scale": s}
+        for d, w, s in product(max_days, max_weeks, wage_scales)
+    ]
+
+
+def _week_arrays(ws, events, avail_days, allowed, wages):
+    import numpy as np
+
+    busy_days = {e["date"] for e in busy_events(events) if e.get("date")}
+    cands = build_week_candidates(ws, wages, events, avail_days, allowed)
+    n = len(cands)
+    day_keys = sorted({c["date"] for c in cands})
+    day_of = np.array([day_keys.index(c["date"]) for c in cands], dtype=np.int64)
+    hours = np.array([c["hours"] for c in cands], dtype=np.float64)
+    base_income = np.array([c["income"] for c in cands], dtype=np.float64)
+    penalty = np.array([busy_day_penalty(c, busy_days) for c in cands], dtype=np.float64)
+    conflict = np.zeros((n, n), dtype=bool)
+    for i in range(n):
+        for j in range(i + 1, n):
+            if day_of[i] == day_of[j] and shifts_conflict(cands[i], cands[j]):
+                conflict[i, j] = conflict[j, i] = True
+    return day_of, len(day_keys), hours, base_income, penalty, conflict
+
+
+def _greedy_batch(day_of, n_days, hours, base_income, penalty, conflict,
+                  max_day, max_week, wage_scale, week_used):
+    # 全シナリオ (S) × 候補 (n) を行列で持って、1手ずつ同時に選ぶ
+    import numpy as np
+
+    S, n = len(max_day), len(hours)
+    picked = np.zeros((S, n), dtype=bool)
+    blocked = np.zeros((S, n), dtype=bool)
+    day_hours = np.zeros((S, n_days))
+    total = np.array(week_used, dtype=np.float64).copy()
+    income = np.outer(wage_scale, base_income)
+    active = np.ones(S, dtype=bool)
+    rows = np.arange(S)
+
+    while active.any():
+        dh = day_hours[:, day_of]
+        sc = income - penalty - np.where(dh > 0, 0, WORKDAY_PENALTY) - dh * DAY_HOURS_PENALTY
+        ok = (
+            ~picked & ~blocked
+            & (total[:, None] + hours <= max_week[:, None])
+            & (dh + hours <= max_day[:, None])
+        )
+        sc = np.where(ok, sc, -np.inf)
+        best = sc.argmax(axis=1)
+        active &= np.isfinite(sc[rows, best])
+        if not active.any():
+            break
+        r, b = rows[active], best[active]
+        picked[r, b] = True
+        blocked[r] |= conflict[b]
+        day_hours[r, day_of[b]] += hours[b]
+        total[r] += hours[b]
+
+    h = (picked * hours).sum(axis=1)
+    inc = (picked * income).sum(axis=1)
+    days = np.zeros((S, n_days), dtype=bool)
+    for d in range(n_days):
+        days[:, d] = (picked & (day_of == d)).any(axis=1)
+    return h, inc, days.sum(axis=1)
+
+
+def evaluate_scenarios(year: int, month: int, scenarios: list[dict],
+                       avail_days: dict[str, list[bool]] | None = None,
+                       user_id: str = DEFAULT_USER) -> list[dict]:
+    import numpy as np
+
+    first, last = month_range(year, month)
+    ym = (first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d"))
+    events = horizon_snapshot(year, month, user_id, [ym])
+    wages = get_wages(user_id)
+
+    max_day = np.array([s["max_day"] for s in scenarios], dtype=np.float64)
+    max_week = np.array([s["max_week"] for s in scenarios], dtype=np.float64)
+    wage_scale = np.array([s["wage_scale"] for s in scenarios], dtype=np.float64)
+    hours = np.zeros(len(scenarios))
+    income = np.zeros(len(scenarios))
+    workdays = np.zeros(len(scenarios), dtype=np.int64)
+
+    for ws in iter_week_starts_in_month(year, month):
+        allowed = {
+            d.strftime("%Y-%m-%d")
+            for d in (ws + timedelta(days=i) for i in range(7))
+            if first <= d <= last
+        }
+        arrays = _week_arrays(ws, events, avail_days, allowed, wages)
+        if len(arrays[2]) == 0:
+            continue
+        used = np.full(len(scenarios), neighbour_hours(events, ws, allowed))
+        h, inc, days = _greedy_batch(*arrays, max_day, max_week, wage_scale, used)
+        hours += h
+        income += inc
+        workdays += days
+
+    return [
+        {**s, "hours": float(hours[k]), "income": int(round(income[k])), "workdays": int(workdays[k])}
+        for k, s in enumerate(scenarios)
+    ]
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from time import perf_counter
+from typing import Callable
+
+WRITE_QUEUE_SIZE = 1024
+WRITE_BATCH_MAX = 64
+
+
+# ---------- Single writer ----------
+# 書き込みはすべてこのスレッドの1本の接続に集める。
+# キューに溜まった分はまとめて1トランザクションでcommitする（group commit）。
+class DbWriter:
+    def __init__(self, db_path: str, archive_path: str | None = None,
+                 maxsize: int = WRITE_QUEUE_SIZE, batch_max: int = WRITE_BATCH_MAX):
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.batch_max = batch_max
+        self._q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._archive_attached = False
+        # 書き込みスレッドが止まった原因。以後の書き込みはすべてこれで失敗させる
+        self._error: BaseException | None = None
+        # 待ち時間の計測（負荷試験などで見る）
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "items": 0, "batches": 0, "errors": 0,
+            "queue_wait_s": 0.0, "queue_wait_max_s": 0.0,
+            "lock_wait_s": 0.0, "lock_wait_max_s": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[[sqlite3.Cursor], object], archive: bool = False) -> Future:
+        # fn(cur) を書き込みスレッドで実行する。commit後に結果がFutureへ入る
+        fut: Future = Future()
+        if self._error is not None:
+            fut.set_exception(self._error)
+            return fut
+        self._q.put((fn, archive, fut, perf_counter()))  # 満杯なら空くまで待つ（背圧）
+        if self._error is not None:
+            self._fail_queued()  # 止まった後に入った分
+        return fut
+
+    @property
+    def alive(self) -> bool:
+        return self._error is None and self._thread.is_alive()
+
+    def stats(self) -> dict:
+        # queue_wait: submitから実行開始まで / lock_wait: BEGIN IMMEDIATE でロックを取るまで
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _record(self, batch, queue_waits: list[float], lock_wait: float, errors: int):
+        with self._stats_lock:
+            s = self._stats
+            s["items"] += len(batch)
+            s["batches"] += 1
+            s["errors"] += errors
+            s["queue_wait_s"] += sum(queue_waits)
+            s["queue_wait_max_s"] = max(s["queue_wait_max_s"], *queue_waits)
+            s["lock_wait_s"] += lock_wait
+            s["lock_wait_max_s"] = max(s["lock_wait_max_s"], lock_wait)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _attach_archive(self, conn):
+        # ATTACHはトランザクション外でしかできないのでBEGIN前に済ませる。
+        # archive.db を作るのはここ（書き込みスレッド）だけなので、表もここで用意する
+        from db import _attach_archive, _init_archive_schema
+
+        _attach_archive(conn)
+        _init_archive_schema(conn)
+        self._archive_attached = True
+
+    def _fail_queued(self):
+        while True:
+            try:
+                _, _, fut, _ = self._q.get_nowait()
+            except queue.Empty:
+                return
+            fut.set_exception(self._error)
+
+    def _run(self):
+        # 接続できない・ROLLBACKまで失敗したなど、続けられない時はスレッドを止め、
+        # 処理中とキューの書き込みをすべてその例外で失敗させる（get_writer が作り直す）
+        batch = []
+        conn = None
+        try:
+            conn = self._connect()
+            while True:
+                batch = [self._q.get()]
+                while len(batch) < self.batch_max:
+                    try:
+                        batch.append(self._q.get_nowait())
+                    except queue.Empty:
+                        break
+                self._run_batch(conn, batch)
+        except Exception as e:
+            self._error = e
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            self._fail_queued()
+            if conn is not None:
+                conn.close()
+
+    def _run_batch(self, conn, batch):
+        started = perf_counter()
+        queue_waits = [started - t for _, _, _, t in batch]
+
+        if not self._archive_attached and any(a for _, a, _, _ in batch):
+            try:
+                self._attach_archive(conn)
+            except Exception as e:
+                for _, _, fut, _ in batch:
+                    fut.set_exception(e)
+                self._record(batch, queue_waits, 0.0, len(batch))
+                return
+
+        results = []
+        cur = conn.cursor()
+        lock_wait = 0.0
+        try:
+            t = perf_counter()
+            cur.execute("BEGIN IMMEDIATE")
+            lock_wait = perf_counter() - t
+            for fn, _, fut, _ in batch:
+                # 1件の失敗で同じバッチの他の書き込みを巻き込まない
+                cur.execute("SAVEPOINT w")
+                try:
+                    results.append((fut, fn(cur), None))
+                    cur.execute("RELEASE w")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO w")
+                    cur.execute("RELEASE w")
+                    results.append((fut, None, e))
+            cur.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            self._record(batch, queue_waits, lock_wait, len(batch))
+            return
+
+        self._record(batch, queue_waits, lock_wait, sum(err is not None for _, _, err in results))
+
+        for fut, res, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+
+_writers: dict[str, DbWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_path: str, archive_path: str | None = None) -> DbWriter:
+    # DBファイルごとにプロセスで1つ（止まっていたら作り直す）
+    key = os.path.abspath(db_path)
+    with _writers_lock:
+        w = _writers.get(key)
+        if w is None or not w.alive:
+            w = DbWriter(db_path, archive_path)
+            _writers[key] = w
+        return w